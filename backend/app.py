@@ -1,15 +1,24 @@
-from flask import Flask
+from flask import Flask, jsonify
 from auth import auth_bp
 from shop_details import shop_bp
 from homepage import homepage_bp
 from items import items_bp
 from bills import bills_bp
 from customers import customers_bp
+from export import export_bp
+from reports import reports_bp
+from jobs import jobs_bp
 from flask_cors import CORS
+from db import pool_stats, replica_stats
+import metrics
+import querylog
+import compression
+from serialization import OrjsonProvider
 from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/api/*": {"origins": "http://placeholder.com"}})
 app.register_blueprint(auth_bp)
 app.register_blueprint(shop_bp)
@@ -17,11 +26,22 @@ app.register_blueprint(homepage_bp)
 app.register_blueprint(items_bp)
 app.register_blueprint(bills_bp)
 app.register_blueprint(customers_bp)
+app.register_blueprint(export_bp)
+app.register_blueprint(reports_bp)
+app.register_blueprint(jobs_bp)
+metrics.init_app(app)
+querylog.init_app(app)
+compression.init_app(app)
 
 @app.route('/')
 def index():
     return "✅ Your backend server is running correctly and the API blueprint is registered!"
 
+@app.route('/api/db-pool')
+def db_pool():
+    """Connection pool counters for this worker process, with any replicas'."""
+    return jsonify({**pool_stats(), "replicas": replica_stats()}), 200
+
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -1,17 +1,12 @@
-import bcrypt
 import jwt
-import psycopg2
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
-from config import SECRET_KEY,DATABASE_URL
+from config import SECRET_KEY
+from db import get_db_connection
+from passwords import hash_password, check_password, needs_rehash, HashingBusy
 
 auth_bp = Blueprint('auth', __name__)
 
-def get_db_connection():
-    """Helper function to create a database connection."""
-    conn = psycopg2.connect(DATABASE_URL)
-    return conn
-
 @auth_bp.route('/api/check-user', methods=['POST'])
 def check_user():
     """Checks if a user's phone number is already in the database."""
@@ -49,30 +44,44 @@ def create_session():
         return jsonify({"error": "Invalid OTP"}), 401 # 401 Unauthorized is appropriate
 
     # --- EXISTING LOGIC: Proceeds only if OTP is correct ---
+    # The connection is released before any hashing so a slow bcrypt call
+    # never holds a pooled connection.
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id, password_hash FROM users WHERE phone_number = %s;", (phone_number,))
+        cur.execute("""
+            SELECT u.id, u.password_hash, EXISTS (SELECT 1 FROM shop WHERE user_id = u.id)
+            FROM users u WHERE u.phone_number = %s;
+        """, (phone_number,))
         user_record = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+
+    try:
         has_shop=False
         user_id = None
         if user_record:
 
-            user_id = user_record[0]
-            stored_hash = user_record[1].encode('utf-8')
-            cur.execute("SELECT 1 FROM shop WHERE user_id = %s;", (user_id,))
-            has_shop = cur.fetchone() is not None
-            if not bcrypt.checkpw(password.encode('utf-8'), stored_hash):
+            user_id, stored_hash, has_shop = user_record
+            if not check_password(password, stored_hash):
                 return jsonify({"error": "Invalid password"}), 401
+            if needs_rehash(stored_hash):
+                # Upgrade hashes made under an older work factor while we have the
+                # password. Best effort: a busy hashing queue must not fail a login
+                # whose password already checked out; the next login retries.
+                try:
+                    _save_password_hash(
+                        "UPDATE users SET password_hash = %s WHERE id = %s RETURNING id;",
+                        (hash_password(password), user_id)
+                    )
+                except Exception as e:
+                    print(f"Password rehash skipped for user {user_id}: {e}")
         else:
-            salt = bcrypt.gensalt()
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-            cur.execute(
+            user_id = _save_password_hash(
                 "INSERT INTO users (phone_number, password_hash) VALUES (%s, %s) RETURNING id;",
-                (phone_number, hashed_password.decode('utf-8'))
+                (phone_number, hash_password(password))
             )
-            user_id = cur.fetchone()[0]
-            conn.commit()
 
         # If we have a valid user_id (from either login or signup), create the token
         if user_id:
@@ -86,10 +95,25 @@ def create_session():
             # This case should ideally not be reached if logic is correct
             return jsonify({"error": "Could not log in or create user"}), 500
 
+    except HashingBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
-        conn.rollback()
         print(f"An error occurred: {e}") # It's good to log the actual error on the server
         return jsonify({"error": "An internal server error occurred"}), 500
+
+
+def _save_password_hash(query, params):
+    """Runs one users write that RETURNING id, on its own short-lived connection."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(query, params)
+        user_id = cur.fetchone()[0]
+        conn.commit()
+        return user_id
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
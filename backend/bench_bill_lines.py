@@ -0,0 +1,104 @@
+"""Benchmarks bill create and edit latency against the number of lines.
+
+    python bench_bill_lines.py [line counts...] [--rounds N]
+
+Drives /api/create-bill and PUT /api/bills/<id> through the Flask test
+client against DATABASE_URL, and prints the median and p95 latency and
+the statements run per request for each line count. Latency and statement
+count should stay nearly flat as bills grow. It writes a throwaway user,
+shop and items, so point DATABASE_URL at a scratch database.
+"""
+import statistics
+import sys
+import time
+import uuid
+import jwt
+import psycopg2
+from flask import has_request_context
+from config import DATABASE_URL, SECRET_KEY
+from db import add_query_listener
+
+DEFAULT_LINE_COUNTS = (1, 10, 50, 200)
+DEFAULT_ROUNDS = 20
+
+_statements = [0]
+
+
+def _count_statement(sql, params, duration, rows):
+    if has_request_context():
+        _statements[0] += 1
+
+
+def _seed_shop(max_lines):
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO users (phone_number, password_hash) VALUES (%s, 'x') RETURNING id;",
+            ('bench-' + uuid.uuid4().hex[:10],)
+        )
+        user_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO shop (user_id, name) VALUES (%s, 'Benchmark shop') RETURNING id;", (user_id,))
+        shop_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO items (shop_id, name, cost_price, wholesale_price, retail_price, stock_quantity, si_unit)
+            SELECT %s, 'Bench item ' || n, 6, 10, 10, 1000000, 'pcs' FROM generate_series(1, %s) n
+            RETURNING id;
+        """, (shop_id, max_lines))
+        item_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    token = jwt.encode({'user_id': str(user_id)}, SECRET_KEY, algorithm="HS256")
+    return {'Authorization': f'Bearer {token}'}, item_ids
+
+
+def _timed(call):
+    _statements[0] = 0
+    started = time.perf_counter()
+    response = call()
+    elapsed = time.perf_counter() - started
+    if response.status_code >= 300:
+        sys.exit(f"Request failed with {response.status_code}: {response.get_data(as_text=True)}")
+    return elapsed * 1000, _statements[0], response
+
+
+def _summary(samples):
+    times = sorted(ms for ms, _ in samples)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    return f"{statistics.median(times):10.1f} {p95:8.1f} {max(count for _, count in samples):6}"
+
+
+def benchmark(line_counts, rounds):
+    from app import app
+    add_query_listener(_count_statement)
+    client = app.test_client()
+    headers, item_ids = _seed_shop(max(line_counts))
+
+    print(f"{'lines':>6} | {'create p50':>10} {'p95':>8} {'stmts':>6} | {'edit p50':>10} {'p95':>8} {'stmts':>6}")
+    for count in line_counts:
+        creates, edits = [], []
+        for _ in range(rounds):
+            lines = [{"item": {"id": item_id}, "quantity": 1, "price": 10} for item_id in item_ids[:count]]
+            ms, statements, response = _timed(lambda: client.post('/api/create-bill', json={
+                "billItems": lines, "totalAmount": 10 * count, "status": "paid", "amountPaid": 10 * count,
+            }, headers=headers))
+            creates.append((ms, statements))
+            bill_id = response.get_json()["bill_id"]
+            for line in lines:
+                line["quantity"] = 2
+            ms, statements, _ = _timed(lambda: client.put(f'/api/bills/{bill_id}', json={
+                "billItems": lines, "totalAmount": 20 * count, "status": "paid", "amountPaid": 20 * count,
+            }, headers=headers))
+            edits.append((ms, statements))
+        print(f"{count:>6} | {_summary(creates)} | {_summary(edits)}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    rounds = DEFAULT_ROUNDS
+    if '--rounds' in args:
+        index = args.index('--rounds')
+        rounds = int(args[index + 1])
+        del args[index:index + 2]
+    benchmark([int(arg) for arg in args] or list(DEFAULT_LINE_COUNTS), rounds)
@@ -0,0 +1,126 @@
+from decimal import Decimal
+from psycopg2.extras import execute_values
+
+
+def to_decimal(value):
+    """Quantities and prices as Decimal, matching the NUMERIC columns; floats go through str."""
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def parse_bill_lines(bill_items):
+    """Returns [(item_id, quantity, price), ...], or None if any line is incomplete."""
+    lines = []
+    for item in bill_items:
+        item_id = (item.get('item') or {}).get('id')
+        quantity = item.get('quantity')
+        price = item.get('price')
+        if not item_id or not quantity or price is None:
+            return None
+        lines.append((item_id, quantity, price))
+    return lines
+
+
+def quantities_by_item(lines):
+    """Sums quantities per item over (item_id, quantity, ...) rows."""
+    totals = {}
+    for item_id, quantity, *_ in lines:
+        totals[item_id] = totals.get(item_id, Decimal(0)) + to_decimal(quantity)
+    return totals
+
+
+def insert_bill_items(cur, bill_id, lines):
+    if not lines:
+        return
+    execute_values(
+        cur,
+        "INSERT INTO bill_items (bill_id, item_id, quantity, price_per_unit) VALUES %s;",
+        [(bill_id, item_id, quantity, price) for item_id, quantity, price in lines],
+        page_size=len(lines),
+    )
+
+
+def save_custom_prices(cur, customer_id, lines):
+    """Upserts the customer's price for every line not sold at retail or wholesale."""
+    if not customer_id or not lines:
+        return
+    item_ids = list({item_id for item_id, _, _ in lines})
+    cur.execute(
+        "SELECT id, retail_price, wholesale_price FROM items WHERE id = ANY(%s::uuid[]);",
+        (item_ids,)
+    )
+    standard_prices = {
+        str(row[0]): [float(p) for p in row[1:] if p is not None]
+        for row in cur.fetchall()
+    }
+
+    # ON CONFLICT cannot touch the same row twice, so the last line for an item wins.
+    custom_prices = {}
+    for item_id, _, price in lines:
+        standard = standard_prices.get(str(item_id))
+        if standard is not None and float(price) not in standard:
+            custom_prices[item_id] = price
+    if not custom_prices:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO customer_item_prices (customer_id, item_id, custom_price)
+        VALUES %s
+        ON CONFLICT (customer_id, item_id) DO UPDATE SET custom_price = EXCLUDED.custom_price;
+        """,
+        [(customer_id, item_id, price) for item_id, price in custom_prices.items()],
+        page_size=len(custom_prices),
+    )
+
+
+def _lines_by_item(lines):
+    grouped = {}
+    for item_id, quantity, price in lines:
+        grouped.setdefault(str(item_id), []).append((to_decimal(quantity), to_decimal(price)))
+    return {item_id: sorted(item_lines) for item_id, item_lines in grouped.items()}
+
+
+def diff_bill_lines(old_lines, new_lines):
+    """Compares two line sets of one bill.
+
+    Returns ({item_id: stock delta}, {item_ids whose lines changed}); the
+    delta is what must be added to stock, i.e. old quantity minus new.
+    """
+    old_by_item = _lines_by_item(old_lines)
+    new_by_item = _lines_by_item(new_lines)
+    changed = {
+        item_id for item_id in old_by_item.keys() | new_by_item.keys()
+        if old_by_item.get(item_id) != new_by_item.get(item_id)
+    }
+    deltas = {}
+    for item_id in changed:
+        old_qty = sum(q for q, _ in old_by_item.get(item_id, []))
+        new_qty = sum(q for q, _ in new_by_item.get(item_id, []))
+        if old_qty != new_qty:
+            deltas[item_id] = old_qty - new_qty
+    return deltas, changed
+
+
+def replace_item_lines(cur, bill_id, item_ids, lines):
+    """Swaps the bill's rows for just the given items with their lines from `lines`."""
+    if not item_ids:
+        return
+    cur.execute(
+        "DELETE FROM bill_items WHERE bill_id = %s AND item_id = ANY(%s::uuid[]);",
+        (bill_id, list(item_ids))
+    )
+    insert_bill_items(cur, bill_id, [line for line in lines if str(line[0]) in item_ids])
+
+
+def sold_stock_deltas(lines):
+    """Stock deltas ({item_id: -quantity}) for selling the given lines."""
+    return {item_id: -quantity for item_id, quantity in quantities_by_item(lines).items()}
+
+
+def write_bill_lines(cur, bill_id, customer_id, lines):
+    """Records a bill's lines with a fixed number of statements, whatever the line count.
+
+    Stock is taken separately, beforehand, by stock.reserve_stock.
+    """
+    insert_bill_items(cur, bill_id, lines)
+    save_custom_prices(cur, customer_id, lines)
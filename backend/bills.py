@@ -1,45 +1,204 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from uuid import UUID
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from decorators import token_required
-from functions import fetch_items
+from db import get_db_connection, fetch_dicts, fetch_dict
+from decorators import token_required, shop_required, read_replica
+from functions import (
+    ITEM_COLUMNS, select_fields, fetch_items, bump_catalog_version, catalog_etag, not_modified, with_etag,
+    encode_cursor, decode_cursor,
+)
 import json
+from rollups import record_bill, lock_shop_sales
+from stock import reserve_stock
+from receivables import record_bill_balance
+from reports import bump_sales_version
+from bill_lines import (
+    parse_bill_lines, quantities_by_item, sold_stock_deltas, write_bill_lines,
+    diff_bill_lines, replace_item_lines, save_custom_prices,
+)
 
 bills_bp = Blueprint('bills', __name__)
 
+# Bill header columns, aliased to the keys the bills screens read.
+BILL_FIELDS = {
+    "id": "b.id",
+    "customer_id": "b.customer_id",
+    "customer_name": "COALESCE(c.name, 'Walk-in') AS customer_name",
+    "totalAmount": 'b.total_amount AS "totalAmount"',
+    "createdAt": 'b.bill_date AS "createdAt"',
+    "status": "b.status",
+    "amountPaid": 'COALESCE(b.amount_paid, 0) AS "amountPaid"',
+}
+BILL_COLUMNS = ", ".join(BILL_FIELDS.values())
+# A bill's lines as one JSON array column, so header and lines come back in one row.
+BILL_ITEMS_JSON = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', bi.item_id, 'name', i.name, 'quantity', bi.quantity, 'price', bi.price_per_unit
+        ))
+        FROM bill_items bi
+        JOIN items i ON bi.item_id = i.id
+        WHERE bi.bill_id = b.id
+    ), '[]'::json) AS items
+"""
+
+# Every bill writer takes its locks in one order: the bill row (edits and
+# deletes), the items (reserve_stock, by id), the shop's sales lock
+# (lock_shop_sales), then the shop-level rows: catalog version, rollups,
+# balances and sales version. The shop lock makes the last group safe to
+# touch in any order. Items are locked FOR NO KEY UPDATE, so the foreign
+# key checks of bill_items and customer_item_prices inserts never wait on
+# another writer's item locks.
+
+def _insufficient_stock(shortfalls):
+    return jsonify({"error": "Insufficient stock for some items", "shortfalls": shortfalls}), 409
+
+
+def _amount_paid_for(status, total_amount, amount_paid):
+    """The amount paid stored with a bill: all of it when paid, none when unpaid."""
+    if status == 'paid':
+        return total_amount
+    if status == 'unpaid':
+        return 0
+    if status == 'partial' and amount_paid is None:
+        return total_amount
+    return amount_paid
+
+
+def _record_bill_totals(cur, bill_id, sign, items=True):
+    """Adds (1) or removes (-1) a bill's totals from the daily rollup and its customer's balance.
+
+    Also invalidates the shop's cached sales reports. items=False skips the
+    per-item rollup when the bill's lines did not change.
+    """
+    record_bill(cur, bill_id, sign, items)
+    record_bill_balance(cur, bill_id, sign)
+    bump_sales_version(cur, bill_id)
+
+
+BILLS_PAGE_SIZE = 50
+BILLS_MAX_PAGE_SIZE = 200
+BILLS_MAX_BATCH = 500
+
+
+def _encode_bills_cursor(bill_date, bill_id):
+    return encode_cursor([bill_date.isoformat(), str(bill_id)])
+
+
+def _decode_bills_cursor(cursor):
+    bill_date, bill_id = decode_cursor(cursor)
+    return datetime.fromisoformat(bill_date), bill_id
+
+
+def _bill_filters(shop_id, args):
+    """Builds the WHERE clause shared by the bills page and its total count."""
+    conditions = ["b.shop_id = %s"]
+    params = [shop_id]
+    if args.get('from'):
+        conditions.append("b.bill_date >= %s")
+        params.append(date.fromisoformat(args['from']))
+    if args.get('to'):
+        # Inclusive of the whole end day
+        conditions.append("b.bill_date < %s")
+        params.append(date.fromisoformat(args['to']) + timedelta(days=1))
+    if args.get('status'):
+        conditions.append("b.status = ANY(%s)")
+        params.append(args['status'].split(','))
+    if args.get('customer_id'):
+        conditions.append("b.customer_id = %s")
+        params.append(args['customer_id'])
+    if args.get('min_amount'):
+        conditions.append("b.total_amount >= %s")
+        params.append(Decimal(args['min_amount']))
+    if args.get('max_amount'):
+        conditions.append("b.total_amount <= %s")
+        params.append(Decimal(args['max_amount']))
+    if args.get('q', '').strip():
+        # Substring of the bill id or the customer's name, as the bills page search box offers.
+        # Bills without a customer are listed as 'Walk-in' and match that name.
+        pattern = "%" + _escape_like(args['q'].strip()) + "%"
+        conditions.append("""(
+            b.id::text ILIKE %s
+            OR b.customer_id IN (SELECT id FROM customers WHERE shop_id = %s AND name ILIKE %s)
+            OR (b.customer_id IS NULL AND 'Walk-in' ILIKE %s)
+        )""")
+        params.extend([pattern, shop_id, pattern, pattern])
+    return conditions, params
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
 @bills_bp.route('/api/bills', methods=['GET'])
 @token_required
-def get_bills(current_user_id):
+@shop_required
+@read_replica
+def get_bills(current_user_id, shop):
+    """Returns one page of bills, newest first.
+
+    Pages are keyed on (bill_date, id); pass back `next_cursor` as `cursor`
+    to continue. Optional filters: from, to (YYYY-MM-DD), status (comma
+    separated), customer_id, min_amount, max_amount, and q (text in the bill
+    id or customer name). `include_total=true` adds the filtered count,
+    which costs an extra scan.
+
+    `ids` (comma separated) fetches up to BILLS_MAX_BATCH specific bills in
+    one page, and `include=items` embeds each bill's lines. `fields`
+    narrows the header columns; id and createdAt are always kept for the
+    cursor.
+    """
+    try:
+        ids = [str(UUID(bill_id)) for bill_id in request.args.get('ids', '').split(',') if bill_id]
+        if len(ids) > BILLS_MAX_BATCH:
+            raise ValueError(f"at most {BILLS_MAX_BATCH} ids per request")
+        default_limit = len(ids) if ids else BILLS_PAGE_SIZE
+        limit = min(int(request.args.get('limit', default_limit)), max(BILLS_MAX_PAGE_SIZE, len(ids)))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        conditions, params = _bill_filters(shop.id, request.args)
+        if ids:
+            conditions.append("b.id = ANY(%s::uuid[])")
+            params.append(ids)
+        include = set(request.args.get('include', '').split(','))
+        columns = select_fields(request.args.get('fields'), BILL_FIELDS, required=('id', 'createdAt'))
+        cursor = request.args.get('cursor')
+        page_conditions, page_params = list(conditions), list(params)
+        if cursor:
+            cursor_date, cursor_id = _decode_bills_cursor(cursor)
+            page_conditions.append("(b.bill_date, b.id) < (%s, %s)")
+            page_params.extend([cursor_date, cursor_id])
+    except (ValueError, ArithmeticError, TypeError) as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user.Please register your shop"}), 404
-        
-        shop_id = shop_record[0]
-        cur.execute("""
-            SELECT b.id, b.customer_id, c.name, b.total_amount, b.bill_date, b.status, b.amount_paid 
+        if 'items' in include:
+            columns += ", " + BILL_ITEMS_JSON
+        cur.execute(f"""
+            SELECT {columns}
             FROM bills b
             LEFT JOIN customers c ON b.customer_id = c.id
-            WHERE b.shop_id = %s
-        """, (shop_id,))
-        bills = cur.fetchall()
-        
-        bills_list = [
-            {
-                "id": bill[0], 
-                "customer_id": bill[1],
-                "customer_name": bill[2] or "Walk-in",
-                "totalAmount": float(bill[3]), 
-                "createdAt": bill[4].isoformat(), 
-                "status": bill[5],
-                "amountPaid": float(bill[6]) if bill[6] is not None else 0
-            }
-            for bill in bills
-        ]
+            WHERE {" AND ".join(page_conditions)}
+            ORDER BY b.bill_date DESC, b.id DESC
+            LIMIT %s
+        """, (*page_params, limit + 1))
+        bills_list = fetch_dicts(cur)
+        has_more = len(bills_list) > limit
+        bills_list = bills_list[:limit]
+        last = bills_list[-1] if has_more else None
+        response = {
+            "bills": bills_list,
+            "next_cursor": _encode_bills_cursor(last["createdAt"], last["id"]) if has_more else None,
+        }
+
+        if request.args.get('include_total', 'false').lower() == 'true':
+            cur.execute(f"SELECT COUNT(*) FROM bills b WHERE {' AND '.join(conditions)};", params)
+            response["total"] = cur.fetchone()[0]
         
-        return jsonify({"bills": bills_list}), 200
+        return jsonify(response), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -52,56 +211,18 @@ def get_bill_details(current_user_id, bill_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        # First, verify the bill belongs to the user's shop
-        cur.execute("""
-            SELECT b.id FROM bills b
+        # Ownership is part of the match, so another shop's bill is simply not found.
+        cur.execute(f"""
+            SELECT {BILL_COLUMNS}, {BILL_ITEMS_JSON}
+            FROM bills b
             JOIN shop s ON b.shop_id = s.id
+            LEFT JOIN customers c ON b.customer_id = c.id
             WHERE b.id = %s AND s.user_id = %s;
         """, (bill_id, current_user_id))
-        bill_record = cur.fetchone()
-        if not bill_record:
+        bill_details = fetch_dict(cur)
+        if not bill_details:
             return jsonify({"error": "Bill not found or access denied"}), 404
 
-        # Fetch bill details
-        cur.execute("""
-            SELECT b.id, b.customer_id, c.name, b.total_amount, b.bill_date, b.status, b.amount_paid 
-            FROM bills b
-            LEFT JOIN customers c ON b.customer_id = c.id
-            WHERE b.id = %s
-        """, (bill_id,))
-        bill = cur.fetchone()
-
-        if not bill:
-            return jsonify({"error": "Bill not found"}), 404
-
-        # Fetch bill items
-        cur.execute("""
-            SELECT bi.item_id, i.name, bi.quantity, bi.price_per_unit
-            FROM bill_items bi
-            JOIN items i ON bi.item_id = i.id
-            WHERE bi.bill_id = %s
-        """, (bill_id,))
-        items = cur.fetchall()
-
-        bill_details = {
-            "id": bill[0],
-            "customer_id": bill[1],
-            "customer_name": bill[2] or "Walk-in",
-            "totalAmount": float(bill[3]),
-            "createdAt": bill[4].isoformat(),
-            "status": bill[5],
-            "amountPaid": float(bill[6]) if bill[6] is not None else 0,
-            "items": [
-                {
-                    "id": item[0],
-                    "name": item[1],
-                    "quantity": item[2],
-                    "price": float(item[3])
-                }
-                for item in items
-            ]
-        }
-        
         return jsonify(bill_details), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -119,21 +240,28 @@ def delete_bill(current_user_id, bill_id):
     try:
         # Verify the bill belongs to the user's shop
         cur.execute("""
-            SELECT b.id FROM bills b
+            SELECT b.shop_id FROM bills b
             JOIN shop s ON b.shop_id = s.id
-            WHERE b.id = %s AND s.user_id = %s;
+            WHERE b.id = %s AND s.user_id = %s
+            FOR UPDATE OF b;
         """, (bill_id, current_user_id))
-        if not cur.fetchone():
+        bill_record = cur.fetchone()
+        if not bill_record:
             return jsonify({"error": "Bill not found or access denied"}), 404
+        shop_id = bill_record[0]
 
         if restore_items:
             # Get items and quantities from the bill
             cur.execute("SELECT item_id, quantity FROM bill_items WHERE bill_id = %s;", (bill_id,))
             items_to_restore = cur.fetchall()
             
-            # Update stock for each item
-            for item_id, quantity in items_to_restore:
-                cur.execute("UPDATE items SET stock_quantity = stock_quantity + %s WHERE id = %s;", (quantity, item_id))
+            # Put the sold quantities back in one statement
+            reserve_stock(cur, shop_id, quantities_by_item(items_to_restore))
+        lock_shop_sales(cur, shop_id)
+        if restore_items:
+            bump_catalog_version(cur, shop_id)
+
+        _record_bill_totals(cur, bill_id, -1)
 
         # Delete bill items
         cur.execute("DELETE FROM bill_items WHERE bill_id = %s;", (bill_id,))
@@ -153,51 +281,75 @@ def delete_bill(current_user_id, bill_id):
 
 @bills_bp.route('/api/bills/<string:bill_id>', methods=['PUT'])
 @token_required
-def update_bill(current_user_id, bill_id):
+@shop_required
+def update_bill(current_user_id, shop, bill_id):
     data = request.get_json()
+    # Header-only edits (status, amount paid, customer) may omit billItems or send null,
+    # and any header field they leave out.
+    lines_sent = data.get('billItems') is not None
+    lines = parse_bill_lines(data.get('billItems') or []) if lines_sent else []
+    if lines is None:
+        return jsonify({"error": "Each item must have item_id, quantity, and price."}), 400
+
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        # Verify ownership
-        cur.execute("SELECT shop_id FROM bills WHERE id = %s;", (bill_id,))
+        # Verify ownership, and hold the bill so a concurrent edit or delete
+        # cannot change its lines between reading and rewriting them
+        cur.execute(
+            "SELECT shop_id, customer_id, total_amount, status, amount_paid FROM bills WHERE id = %s FOR UPDATE;",
+            (bill_id,)
+        )
         bill_record = cur.fetchone()
         if not bill_record:
             return jsonify({"error": "Bill not found"}), 404
 
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_id = cur.fetchone()[0]
+        shop_id = shop.id
         if shop_id != bill_record[0]:
             return jsonify({"error": "Access denied"}), 403
-
-        # Fetch original bill items to calculate stock changes
-        cur.execute("SELECT item_id, quantity FROM bill_items WHERE bill_id = %s;", (bill_id,))
-        original_items = cur.fetchall()
-        
-        # Restore stock for all original items
-        for item_id, quantity in original_items:
-            cur.execute("UPDATE items SET stock_quantity = stock_quantity + %s WHERE id = %s;", (quantity, item_id))
-
-        # Delete old bill items
-        cur.execute("DELETE FROM bill_items WHERE bill_id = %s;", (bill_id,))
-
-        # Process new/updated data
-        customer_name = data.get('customerName')
-        customer_phone = data.get('customerPhone')
-        bill_items = data.get('billItems')
-        total_amount = data.get('totalAmount')
-        status = data.get('status')
-        amount_paid = data.get('amountPaid')
-
-        # Customer handling
-        customer_id = None
-        if customer_phone:
-            cur.execute("SELECT id FROM customers WHERE phone_number = %s AND shop_id = %s;", (customer_phone, shop_id))
-            customer_record = cur.fetchone()
-            if customer_record:
-                customer_id = customer_record[0]
-        if not customer_id and customer_name:
-            cur.execute("INSERT INTO customers (name, phone_number, shop_id) VALUES (%s, %s, %s) RETURNING id;", (customer_name, customer_phone, shop_id))
-            customer_id = cur.fetchone()[0]
+        original_customer_id = bill_record[1]
+
+        stock_deltas, changed_items = {}, set()
+        if lines_sent:
+            # Only items whose lines actually changed are rewritten, and only
+            # their net quantity change touches stock. Stock is reserved in the
+            # same order create_new_bill uses.
+            cur.execute("SELECT item_id, quantity, price_per_unit FROM bill_items WHERE bill_id = %s;", (bill_id,))
+            original_lines = cur.fetchall()
+            stock_deltas, changed_items = diff_bill_lines(original_lines, lines)
+            shortfalls = reserve_stock(cur, shop_id, stock_deltas)
+            if shortfalls:
+                conn.rollback()
+                return _insufficient_stock(shortfalls)
+        lock_shop_sales(cur, shop_id)
+        if stock_deltas:
+            bump_catalog_version(cur, shop_id)
+
+        # Take the old totals out of the rollup and balance; the edited bill is
+        # added back below. Edits never move the bill date, so the per-item
+        # rollup only changes when some lines did.
+        lines_changed = bool(changed_items)
+        _record_bill_totals(cur, bill_id, -1, lines_changed)
+
+        # Header fields missing from the payload keep their stored values
+        total_amount = data.get('totalAmount', bill_record[2])
+        status = data.get('status', bill_record[3])
+        amount_paid = _amount_paid_for(status, total_amount, data.get('amountPaid', bill_record[4]))
+
+        # Customer handling; sending either customer field (even empty) reassigns the bill
+        customer_id = original_customer_id
+        if 'customerName' in data or 'customerPhone' in data:
+            customer_name = data.get('customerName')
+            customer_phone = data.get('customerPhone')
+            customer_id = None
+            if customer_phone:
+                cur.execute("SELECT id FROM customers WHERE phone_number = %s AND shop_id = %s;", (customer_phone, shop_id))
+                customer_record = cur.fetchone()
+                if customer_record:
+                    customer_id = customer_record[0]
+            if not customer_id and customer_name:
+                cur.execute("INSERT INTO customers (name, phone_number, shop_id) VALUES (%s, %s, %s) RETURNING id;", (customer_name, customer_phone, shop_id))
+                customer_id = cur.fetchone()[0]
 
         # Update bill
         cur.execute("""
@@ -206,28 +358,17 @@ def update_bill(current_user_id, bill_id):
             WHERE id = %s;
         """, (customer_id, total_amount, status, amount_paid, bill_id))
 
-        # Insert new bill items and update stock
-        for item in bill_items:
-            item_id = item.get('item').get('id')
-            quantity_sold = item.get('quantity')
-            price = item.get('price')
-
-            cur.execute("UPDATE items SET stock_quantity = stock_quantity - %s WHERE id = %s;", (quantity_sold, item_id))
-            cur.execute("INSERT INTO bill_items (bill_id, item_id, quantity, price_per_unit) VALUES (%s, %s, %s, %s);", (bill_id, item_id, quantity_sold, price))
-
-            # Update customer-specific pricing
-            if customer_id:
-                cur.execute("SELECT retail_price, wholesale_price FROM items WHERE id = %s;", (item_id,))
-                item_prices = cur.fetchone()
-                if item_prices:
-                    is_standard = (price == item_prices[0] or price == item_prices[1])
-                    if not is_standard:
-                        cur.execute("""
-                            INSERT INTO customer_item_prices (customer_id, item_id, custom_price)
-                            VALUES (%s, %s, %s)
-                            ON CONFLICT (customer_id, item_id) DO UPDATE SET custom_price = EXCLUDED.custom_price;
-                        """, (customer_id, item_id, price))
+        if lines_sent:
+            replace_item_lines(cur, bill_id, changed_items, lines)
 
+            # Customer-specific pricing for changed lines, or for all of them
+            # when the bill moved to another customer
+            if customer_id != original_customer_id:
+                save_custom_prices(cur, customer_id, lines)
+            else:
+                save_custom_prices(cur, customer_id, [line for line in lines if str(line[0]) in changed_items])
+
+        _record_bill_totals(cur, bill_id, 1, lines_changed)
         conn.commit()
         return jsonify({"message": "Bill updated successfully"}), 200
 
@@ -240,67 +381,89 @@ def update_bill(current_user_id, bill_id):
 
 @bills_bp.route('/api/start-bills', methods=['POST','GET'])
 @token_required
-def create_bill(current_user_id):
+@shop_required
+def create_bill(current_user_id, shop):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user.Please register your shop"}), 404  
-        items = fetch_items(current_user_id)
-        if isinstance(items, str):
-            return jsonify({"error": items}), 404
-
-        return jsonify({"items": items})
+        etag = catalog_etag(cur, shop.id, "start-bills")
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        items = fetch_items(cur, shop.id)
+        return with_etag(jsonify({"items": items}), etag)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# Matches the customers_shop_id_btrim_phone_idx expression index.
+CUSTOMER_BY_PHONE = """
+    SELECT id FROM customers
+    WHERE shop_id = %(shop_id)s AND btrim(phone_number) = %(phone)s
+    LIMIT 1
+"""
+PRICED_ITEM_COLUMNS = ", ".join(f"i.{column.strip()}" for column in ITEM_COLUMNS.split(","))
+
 
 @bills_bp.route('/api/customer-prices', methods=['GET'])
 @token_required
-def get_customer_prices(current_user_id):
+@shop_required
+def get_customer_prices(current_user_id, shop):
+    """The shop's catalog with the customer's custom prices, in one round trip.
+
+    With ?mode=overrides only the customer's custom prices are returned, for
+    clients that already hold the catalog from /api/items.
+    """
     phone_number = request.args.get('phone_number')
     if not phone_number or len(phone_number) != 10:
         return jsonify({"error": "A 10-digit phone number is required"}), 400
+    mode = request.args.get('mode', 'full')
+    if mode not in ('full', 'overrides'):
+        return jsonify({"error": "mode must be full or overrides"}), 400
+    params = {"shop_id": shop.id, "phone": phone_number}
 
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user."})
-        shop_id = shop_record[0]
-
-        cur.execute("SELECT id FROM customers WHERE TRIM(phone_number) = %s AND shop_id = %s;", (phone_number, shop_id))
-        customer_record = cur.fetchone()
-
-        all_items = fetch_items(current_user_id)
-        if isinstance(all_items, str):
-            return jsonify({"error": all_items}), 404
-
-        if not customer_record:
-            return jsonify({"items": all_items, "customer_items": []}), 200
-
-        customer_id = customer_record[0]
-
-        cur.execute("""
-            SELECT item_id, custom_price
-            FROM customer_item_prices
-            WHERE customer_id = %s;
-        """, (customer_id,))
-        customer_prices_records = cur.fetchall()
-        
-        customer_prices_map = {str(record[0]): float(record[1]) for record in customer_prices_records}
-
+        if mode == 'overrides':
+            cur.execute(f"""
+                WITH customer AS ({CUSTOMER_BY_PHONE})
+                SELECT customer.id AS customer_id, cip.item_id AS id, cip.custom_price
+                FROM customer
+                -- Overrides on deleted items drop out inside the join, so the
+                -- customer row stays even when every override is on one.
+                LEFT JOIN (
+                    customer_item_prices cip
+                    JOIN items i ON i.id = cip.item_id AND i.is_delete = 0
+                ) ON cip.customer_id = customer.id;
+            """, params)
+            rows = fetch_dicts(cur)
+            return jsonify({
+                "customer_id": rows[0]["customer_id"] if rows else None,
+                "overrides": [
+                    {"id": row["id"], "custom_price": float(row["custom_price"])}
+                    for row in rows if row["id"] is not None
+                ],
+            }), 200
+
+        cur.execute(f"""
+            WITH customer AS ({CUSTOMER_BY_PHONE})
+            SELECT {PRICED_ITEM_COLUMNS}, cip.custom_price
+            FROM items i
+            LEFT JOIN customer_item_prices cip
+                   ON cip.item_id = i.id AND cip.customer_id = (SELECT id FROM customer)
+            WHERE i.shop_id = %(shop_id)s AND i.is_delete = 0;
+        """, params)
+        all_items = []
         customer_items = []
-        for item in all_items:
-            item_id_str = str(item['id'])
-            if item_id_str in customer_prices_map:
-                customer_item = item.copy()
-                customer_item['custom_price'] = customer_prices_map[item_id_str]
-                customer_items.append(customer_item)
+        for item in fetch_dicts(cur):
+            custom_price = item.pop('custom_price')
+            all_items.append(item)
+            if custom_price is not None:
+                customer_items.append({**item, 'custom_price': float(custom_price)})
 
         return jsonify({"items": all_items, "customer_items": customer_items}), 200
 
@@ -309,9 +472,12 @@ def get_customer_prices(current_user_id):
     finally:
         cur.close()
         conn.close()
+
+
 @bills_bp.route('/api/create-bill', methods=['POST'])
 @token_required
-def create_new_bill(current_user_id):
+@shop_required
+def create_new_bill(current_user_id, shop):
     data = request.get_json()
     customer_name = data.get('customerName')
     customer_phone = data.get('customerPhone')
@@ -323,23 +489,24 @@ def create_new_bill(current_user_id):
     if not bill_items or not isinstance(bill_items, list) or len(bill_items) == 0:
         return jsonify({"error": "At least one item is required to create a bill."} ), 400
 
-    # Handle amount_paid based on status
-    if status == 'paid':
-        amount_paid = total_amount
-    elif status == 'unpaid':
-        amount_paid = 0
-    elif status == 'partial':
-        if amount_paid is None:
-            amount_paid = total_amount 
+    lines = parse_bill_lines(bill_items)
+    if lines is None:
+        return jsonify({"error": "Each item must have item_id, quantity, and price."} ), 400
+
+    amount_paid = _amount_paid_for(status, total_amount, amount_paid)
 
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user."} ), 404
-        shop_id = shop_record[0]
+        shop_id = shop.id
+
+        # Take stock first so a short item fails the bill before anything is written
+        shortfalls = reserve_stock(cur, shop_id, sold_stock_deltas(lines))
+        if shortfalls:
+            conn.rollback()
+            return _insufficient_stock(shortfalls)
+        lock_shop_sales(cur, shop_id)
+        bump_catalog_version(cur, shop_id)
 
         customer_id = None
         if customer_name or customer_phone:
@@ -372,50 +539,9 @@ def create_new_bill(current_user_id):
         )
         bill_id = cur.fetchone()[0]
 
-        # Insert into bill_items table and update stock
-        for item in bill_items:
-            item_id = item.get('item').get('id')
-            quantity_sold = item.get('quantity')
-            price = item.get('price')
-
-            if not item_id or not quantity_sold or price is None:
-                conn.rollback()
-                return jsonify({"error": "Each item must have item_id, quantity, and price."} ), 400
-
-            # Update stock without checking if it will go negative
-            cur.execute(
-                "UPDATE items SET stock_quantity = stock_quantity - %s WHERE id = %s;",
-                (quantity_sold, item_id)
-            )
-
-            cur.execute(
-                """
-                INSERT INTO bill_items (bill_id, item_id, quantity, price_per_unit) 
-                VALUES (%s, %s, %s, %s);
-                """,
-                (bill_id, item_id, quantity_sold, price)
-            )
-
-            # Save custom price if necessary
-            if customer_id:
-                cur.execute("SELECT retail_price, wholesale_price FROM items WHERE id = %s;", (item_id,))
-                item_prices = cur.fetchone()
-                if item_prices:
-                    retail_price, wholesale_price = item_prices
-                    # Using 'is not' for precise comparison with None
-                    is_standard_price = (price is not None and retail_price is not None and float(price) == float(retail_price)) or \
-                                        (price is not None and wholesale_price is not None and float(price) == float(wholesale_price))
-
-                    if not is_standard_price:
-                        # Upsert into customer_item_prices
-                        cur.execute(
-                            """
-                            INSERT INTO customer_item_prices (customer_id, item_id, custom_price)
-                            VALUES (%s, %s, %s)
-                            ON CONFLICT (customer_id, item_id) DO UPDATE SET custom_price = EXCLUDED.custom_price;
-                            """,
-                            (customer_id, item_id, price)
-                        )
+        # Insert bill lines and save custom prices in bulk
+        write_bill_lines(cur, bill_id, customer_id, lines)
+        _record_bill_totals(cur, bill_id, 1)
 
         conn.commit()
         return jsonify({"message": "Bill created successfully", "bill_id": bill_id}), 201
@@ -0,0 +1,56 @@
+"""Negotiated gzip/brotli compression of API responses.
+
+Levels are kept low on purpose: the hot list endpoints are compressed on
+every request, and at these levels JSON still shrinks to a fraction of its
+size for a small part of the CPU the default levels cost.
+"""
+import gzip
+import os
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is offered only when it is installed
+    brotli = None
+
+# Bodies smaller than this are sent as they are; compressing them saves little.
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '3'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/msgpack', 'application/x-ndjson',
+    'text/csv', 'text/plain', 'text/html',
+}
+
+
+def _choose_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = request.accept_encodings.best_match(offered)
+    return best if best and request.accept_encodings[best] > 0 else None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def init_app(app):
+    @app.after_request
+    def compress_response(response):
+        # Streamed bodies (exports) are left alone: they would have to be buffered.
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+        response.set_data(_compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,98 @@
+"""Shared test fixtures.
+
+Database tests run against TEST_DATABASE_URL, which is wiped and rebuilt
+from tests/schema.sql plus migrations/ once per session; without it they
+are skipped. The app's DATABASE_URL is pointed at the same database, so a
+developer's config.py can never aim the tests at a real one.
+"""
+import os
+import sys
+import types
+import uuid
+import jwt
+import psycopg2
+import pytest
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'schema.sql')
+
+try:
+    import config
+except ImportError:  # config.py holds deployment settings and is not committed
+    config = types.ModuleType('config')
+    sys.modules['config'] = config
+config.DATABASE_URL = TEST_DATABASE_URL or ''
+config.SECRET_KEY = getattr(config, 'SECRET_KEY', None) or 'test-secret-key-for-the-test-suite'
+
+pytest_plugins = ["pytest_query_budget"]
+
+
+@pytest.fixture(scope='session')
+def database():
+    """DSN of a freshly built test database."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import migrate
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    with open(SCHEMA_PATH) as f:
+        cur.execute(f.read())
+    conn.close()
+    migrate.migrate(TEST_DATABASE_URL)
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture
+def db_conn(database):
+    conn = psycopg2.connect(database)
+    conn.autocommit = True
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope='session')
+def app(database):
+    from app import app as flask_app
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class ShopOwner:
+    """A user with a registered shop, and helpers to seed it."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO users (phone_number, password_hash) VALUES (%s, 'x') RETURNING id;",
+            (uuid.uuid4().hex[:10],)
+        )
+        self.user_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO shop (user_id, name) VALUES (%s, 'Test shop') RETURNING id;", (self.user_id,))
+        self.shop_id = cur.fetchone()[0]
+        cur.close()
+        token = jwt.encode({'user_id': self.user_id}, config.SECRET_KEY, algorithm="HS256")
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def add_items(self, count, stock=1000, price=10, cost=6):
+        cur = self.conn.cursor()
+        cur.execute("""
+            INSERT INTO items (shop_id, name, cost_price, wholesale_price, retail_price, stock_quantity, si_unit)
+            SELECT %s, 'Item ' || n, %s, %s, %s, %s, 'pcs' FROM generate_series(1, %s) n
+            RETURNING id;
+        """, (self.shop_id, cost, price, price, stock, count))
+        ids = [row[0] for row in cur.fetchall()]
+        cur.close()
+        return ids
+
+
+@pytest.fixture
+def owner(db_conn):
+    return ShopOwner(db_conn)
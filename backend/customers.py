@@ -1,25 +1,30 @@
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from decorators import token_required
+from db import get_db_connection, fetch_dicts, fetch_dict
+from decorators import token_required, shop_required, read_replica
+from functions import encode_cursor, decode_cursor, select_fields
+
+RECEIVABLES_PAGE_SIZE = 50
+RECEIVABLES_MAX_PAGE_SIZE = 200
+CUSTOMER_FIELDS = {column: column for column in ("id", "name", "phone_number", "email", "address")}
 
 customers_bp = Blueprint('customers', __name__)
 
 @customers_bp.route('/api/customers', methods=['GET'])
 @token_required
-def get_customers(current_user_id):
+@shop_required
+@read_replica
+def get_customers(current_user_id, shop):
+    """The shop's active customers by name; `?fields=id,name,...` selects only those columns."""
+    try:
+        columns = select_fields(request.args.get('fields'), CUSTOMER_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_id = cur.fetchone()[0]
-
-        cur.execute("SELECT id, name, phone_number, email, address FROM customers WHERE shop_id = %s AND is_delete = 0 ORDER BY name;", (shop_id,))
-        customers = cur.fetchall()
-        
-        customers_list = [
-            {"id": c[0], "name": c[1], "phone_number": c[2], "email": c[3], "address": c[4]}
-            for c in customers
-        ]
+        cur.execute(f"SELECT {columns} FROM customers WHERE shop_id = %s AND is_delete = 0 ORDER BY name;", (shop.id,))
+        customers_list = fetch_dicts(cur)
         
         return jsonify({"customers": customers_list}), 200
     except Exception as e:
@@ -30,7 +35,8 @@ def get_customers(current_user_id):
 
 @customers_bp.route('/api/customers', methods=['POST'])
 @token_required
-def create_customer(current_user_id):
+@shop_required
+def create_customer(current_user_id, shop):
     data = request.get_json()
     name = data.get('name')
     phone_number = data.get('phone_number')
@@ -46,15 +52,12 @@ def create_customer(current_user_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_id = cur.fetchone()[0]
-
         if phone_number:
             cur.execute("SELECT id FROM customers WHERE phone_number = %s;", (phone_number,))
             if cur.fetchone():
                 return jsonify({"error": "A customer with this phone number already exists"}), 409
 
-        cur.execute("INSERT INTO customers (name, phone_number, email, address, shop_id) VALUES (%s, %s, %s, %s, %s) RETURNING id;", (name, phone_number, email, address, shop_id))
+        cur.execute("INSERT INTO customers (name, phone_number, email, address, shop_id) VALUES (%s, %s, %s, %s, %s) RETURNING id;", (name, phone_number, email, address, shop.id))
         new_customer_id = cur.fetchone()[0]
         conn.commit()
         
@@ -68,7 +71,8 @@ def create_customer(current_user_id):
 
 @customers_bp.route('/api/customers/<string:customer_id>', methods=['PUT'])
 @token_required
-def update_customer(current_user_id, customer_id):
+@shop_required
+def update_customer(current_user_id, shop, customer_id):
     data = request.get_json()
     name = data.get('name')
     phone_number = data.get('phone_number')
@@ -84,10 +88,7 @@ def update_customer(current_user_id, customer_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_id = cur.fetchone()[0]
-
-        cur.execute("SELECT id FROM customers WHERE id = %s AND shop_id = %s;", (customer_id, shop_id))
+        cur.execute("SELECT id FROM customers WHERE id = %s AND shop_id = %s;", (customer_id, shop.id))
         if not cur.fetchone():
             return jsonify({"error": "Customer not found or access denied"}), 404
 
@@ -104,14 +105,12 @@ def update_customer(current_user_id, customer_id):
 
 @customers_bp.route('/api/customers/<string:customer_id>', methods=['DELETE'])
 @token_required
-def delete_customer(current_user_id, customer_id):
+@shop_required
+def delete_customer(current_user_id, shop, customer_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_id = cur.fetchone()[0]
-
-        cur.execute("SELECT id FROM customers WHERE id = %s AND shop_id = %s;", (customer_id, shop_id))
+        cur.execute("SELECT id FROM customers WHERE id = %s AND shop_id = %s;", (customer_id, shop.id))
         if not cur.fetchone():
             return jsonify({"error": "Customer not found or access denied"}), 404
 
@@ -125,3 +124,69 @@ def delete_customer(current_user_id, customer_id):
     finally:
         cur.close()
         conn.close()
+
+@customers_bp.route('/api/customers/receivables', methods=['GET'])
+@token_required
+@shop_required
+def get_receivables(current_user_id, shop):
+    """Customers who owe money, largest balance first, paged by (outstanding, customer_id)."""
+    try:
+        limit = min(int(request.args.get('limit', RECEIVABLES_PAGE_SIZE)), RECEIVABLES_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        conditions = ["cb.shop_id = %s", "cb.outstanding > 0"]
+        params = [shop.id]
+        if request.args.get('cursor'):
+            outstanding, customer_id = decode_cursor(request.args['cursor'])
+            conditions.append("(cb.outstanding, cb.customer_id) < (%s::numeric, %s)")
+            params.extend([outstanding, customer_id])
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT cb.customer_id AS id, c.name, c.phone_number, cb.outstanding, cb.updated_at
+            FROM customer_balances cb
+            JOIN customers c ON c.id = cb.customer_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY cb.outstanding DESC, cb.customer_id DESC
+            LIMIT %s;
+        """, (*params, limit + 1))
+        customers_list = fetch_dicts(cur)
+        has_more = len(customers_list) > limit
+        customers_list = customers_list[:limit]
+        next_cursor = None
+        if has_more:
+            last = customers_list[-1]
+            next_cursor = encode_cursor([str(last["outstanding"]), str(last["id"])])
+        return jsonify({"customers": customers_list, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@customers_bp.route('/api/customers/<string:customer_id>/balance', methods=['GET'])
+@token_required
+@shop_required
+def get_customer_balance(current_user_id, shop, customer_id):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT c.id, COALESCE(cb.outstanding, 0) AS outstanding, cb.updated_at
+            FROM customers c
+            LEFT JOIN customer_balances cb ON cb.customer_id = c.id
+            WHERE c.id = %s AND c.shop_id = %s;
+        """, (customer_id, shop.id))
+        balance = fetch_dict(cur)
+        if not balance:
+            return jsonify({"error": "Customer not found or access denied"}), 404
+        return jsonify(balance), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
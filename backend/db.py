@@ -1,6 +1,366 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 import psycopg2
+from psycopg2 import extensions
 from config import DATABASE_URL
 
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+# Seconds a request waits for a free connection before giving up.
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+# Connections idle for longer than this are pinged before being handed out.
+POOL_HEALTHCHECK_AFTER = float(os.getenv('DB_POOL_HEALTHCHECK_AFTER', '30'))
+
+# Comma-separated DSNs of streaming replicas that may serve read-only handlers.
+REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+# A replica further behind than this (seconds) is skipped until it catches up.
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))
+# How often each replica's lag is re-measured, and how long an unreachable one is skipped.
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '1'))
+REPLICA_RETRY_AFTER = float(os.getenv('DB_REPLICA_RETRY_AFTER', '30'))
+# Clients that wrote within this many seconds read from the primary (read-your-writes).
+READ_YOUR_WRITES_WINDOW = float(os.getenv('DB_READ_YOUR_WRITES_WINDOW', '5'))
+
+
+_query_listeners = []
+
+
+def add_query_listener(listener):
+    """Registers listener(sql, params, duration_seconds, rows) for every executed statement."""
+    _query_listeners.append(listener)
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor that reports each statement's timing to the registered query listeners."""
+
+    def execute(self, query, vars=None):
+        if not _query_listeners:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._report(query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        if not _query_listeners:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._report(query, vars_list, time.perf_counter() - started)
+
+    def _report(self, query, vars, duration):
+        rows = self.rowcount if self.description is not None and self.rowcount > 0 else 0
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        for listener in _query_listeners:
+            listener(query, vars, duration, rows)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of psycopg2 connections owned by one process."""
+
+    def __init__(self, dsn, min_size, max_size, timeout, healthcheck_after):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, last returned at)
+        self._in_use = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=InstrumentedCursor)
+        self.created += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1;")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            waited = False
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        # Connecting and health checks happen outside the lock so one slow
+        # socket does not stall every other checkout.
+        try:
+            if entry is not None:
+                conn, idle_since = entry
+                if self._is_healthy(conn, idle_since):
+                    return conn
+                self._discard(conn)
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn):
+        if os.getpid() != self.pid:
+            # Inherited across a fork; the parent still owns the socket.
+            return
+        keep = not conn.closed
+        if keep and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                keep = False
+        if not keep:
+            self._discard(conn)
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pid": self.pid,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "discarded": self.discarded,
+            }
+
+
+class PooledConnection:
+    """Proxy handed to handlers; close() returns the connection to its pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(dsn, min_size):
+    pool = _pools.get(dsn)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        pool = _pools.get(dsn)
+        if pool is None or pool.pid != os.getpid():
+            # Connections inherited from a parent are dropped, never closed.
+            pool = _pools[dsn] = ConnectionPool(
+                dsn,
+                min_size,
+                POOL_MAX_SIZE,
+                POOL_TIMEOUT,
+                POOL_HEALTHCHECK_AFTER,
+            )
+        return pool
+
+
+def get_pool():
+    """Returns this process's primary pool, creating it lazily after any fork."""
+    return _get_pool(DATABASE_URL, POOL_MIN_SIZE)
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+class Replica:
+    """Routing state for one replica DSN; its pool opens connections on demand."""
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.skip_until = 0.0
+        self.lag_checked_at = 0.0
+        self.lag = None
+
+    @property
+    def pool(self):
+        # min_size 0, so a replica that is down never blocks pool creation.
+        return _get_pool(self.dsn, 0)
+
+    def skip(self, seconds):
+        self.skip_until = time.monotonic() + seconds
+
+    def measure_lag(self, conn):
+        """Replay lag in seconds; 0 while the replica has replayed all it has received."""
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END;
+            """)
+            lag = float(cur.fetchone()[0])
+        finally:
+            cur.close()
+        conn.rollback()
+        self.lag = lag
+        self.lag_checked_at = time.monotonic()
+        return lag
+
+    def stats(self):
+        return {
+            **self.pool.stats(),
+            "lag": self.lag,
+            "skipped_for": max(0.0, round(self.skip_until - time.monotonic(), 1)),
+        }
+
+
+_replicas = [Replica(dsn) for dsn in REPLICA_URLS]
+_replica_turn = 0
+_read_only = ContextVar('db_read_only', default=False)
+
+
+def note_write():
+    """Timestamp of a write, for the client to send back on its next requests.
+
+    The client carries it, so its reads stay on the primary for
+    READ_YOUR_WRITES_WINDOW seconds whichever worker serves them. None when
+    no replica is configured.
+    """
+    return f"{time.time():.3f}" if _replicas else None
+
+
+def recently_wrote(written_at):
+    """True if `written_at`, a note_write() value sent back by the client, is within the window."""
+    try:
+        age = time.time() - float(written_at)
+    except (TypeError, ValueError):
+        return False
+    # Tolerates clock skew between hosts in both directions
+    return -READ_YOUR_WRITES_WINDOW < age < READ_YOUR_WRITES_WINDOW
+
+
+@contextmanager
+def replica_reads():
+    """Lets get_db_connection() hand out replica connections inside the block."""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def _replica_connection():
+    """A connection to a healthy, caught-up replica, or None to fall back to the primary."""
+    global _replica_turn
+    now = time.monotonic()
+    _replica_turn += 1
+    for offset in range(len(_replicas)):
+        replica = _replicas[(_replica_turn + offset) % len(_replicas)]
+        if replica.skip_until > now:
+            continue
+        pool = replica.pool
+        try:
+            conn = pool.getconn()
+        except (psycopg2.Error, PoolTimeout) as e:
+            print(f"Replica unavailable, using another: {e}")
+            replica.skip(REPLICA_RETRY_AFTER)
+            continue
+        try:
+            if now - replica.lag_checked_at >= REPLICA_LAG_CHECK_INTERVAL:
+                lag = replica.measure_lag(conn)
+                if lag > REPLICA_MAX_LAG:
+                    pool.putconn(conn)
+                    replica.skip(REPLICA_LAG_CHECK_INTERVAL)
+                    continue
+        except psycopg2.Error as e:
+            print(f"Replica lag check failed, using another: {e}")
+            pool.putconn(conn)
+            replica.skip(REPLICA_RETRY_AFTER)
+            continue
+        return PooledConnection(pool, conn)
+    return None
+
+
+def replica_stats():
+    return [replica.stats() for replica in _replicas]
+
+
 def get_db_connection():
-    conn = psycopg2.connect(DATABASE_URL)
-    return conn
\ No newline at end of file
+    """A pooled connection: to a replica inside replica_reads() when one is usable, else the primary."""
+    if _replicas and _read_only.get():
+        conn = _replica_connection()
+        if conn is not None:
+            return conn
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
+
+
+def fetch_dicts(cur):
+    """Fetches the remaining rows as dicts keyed by the result's column names."""
+    columns = tuple(col[0] for col in cur.description)
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def fetch_dict(cur):
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip((col[0] for col in cur.description), row))
@@ -1,7 +1,15 @@
+import math
 import jwt
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, make_response
 from config import SECRET_KEY
+from functions import get_shop
+from db import note_write, recently_wrote, replica_reads, READ_YOUR_WRITES_WINDOW
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Set on write responses when replicas are in use; read_replica sends the
+# client's next reads to the primary while it is recent.
+LAST_WRITE_COOKIE = 'last_write'
 
 def token_required(f):
     @wraps(f)
@@ -19,5 +27,40 @@ def token_required(f):
         except Exception as e:
             return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
         
-        return f(current_user_id, *args, **kwargs)
+        response = f(current_user_id, *args, **kwargs)
+        written_at = note_write() if request.method not in SAFE_METHODS else None
+        if written_at:
+            response = make_response(response)
+            response.set_cookie(
+                LAST_WRITE_COOKIE, written_at, max_age=math.ceil(READ_YOUR_WRITES_WINDOW),
+                path='/api', httponly=True, samesite='Lax'
+            )
+        return response
+    return decorated
+
+def shop_required(f):
+    """Resolves the caller's shop and passes it to the handler after the user id.
+
+    Must be applied below @token_required.
+    """
+    @wraps(f)
+    def decorated(current_user_id, *args, **kwargs):
+        shop = get_shop(current_user_id)
+        if shop is None:
+            return jsonify({"error": "No shop associated with this user. Please register your shop."}), 404
+        return f(current_user_id, shop, *args, **kwargs)
+    return decorated
+
+def read_replica(f):
+    """Serves a read-only handler from a replica, unless the client wrote moments ago.
+
+    Must be applied below @token_required (and @shop_required). Falls back
+    to the primary on its own when no replica is configured or usable.
+    """
+    @wraps(f)
+    def decorated(current_user_id, *args, **kwargs):
+        if recently_wrote(request.cookies.get(LAST_WRITE_COOKIE)):
+            return f(current_user_id, *args, **kwargs)
+        with replica_reads():
+            return f(current_user_id, *args, **kwargs)
     return decorated
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+from datetime import datetime
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from db import get_db_connection
+from decorators import token_required, shop_required
+from serialization import to_json
+
+export_bp = Blueprint('export', __name__)
+
+# Rows pulled from the server-side cursor per round trip, and per chunk written out.
+EXPORT_FETCH_SIZE = 2000
+
+EXPORT_QUERIES = {
+    # One row per bill line; bills without lines still appear once.
+    'bills': """
+        SELECT b.id AS bill_id, b.bill_date, b.status, b.total_amount, b.amount_paid,
+               b.customer_id, c.name AS customer_name, c.phone_number AS customer_phone,
+               bi.item_id, i.name AS item_name, bi.quantity, bi.price_per_unit
+        FROM bills b
+        LEFT JOIN customers c ON b.customer_id = c.id
+        LEFT JOIN bill_items bi ON bi.bill_id = b.id
+        LEFT JOIN items i ON bi.item_id = i.id
+        WHERE b.shop_id = %s
+        ORDER BY b.bill_date, b.id
+    """,
+    'items': """
+        SELECT id, name, description, cost_price, wholesale_price, retail_price,
+               stock_quantity, si_unit, is_delete
+        FROM items
+        WHERE shop_id = %s
+        ORDER BY name, id
+    """,
+    'customers': """
+        SELECT id, name, phone_number, email, address, is_delete
+        FROM customers
+        WHERE shop_id = %s
+        ORDER BY name, id
+    """,
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _csv_chunk(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+
+def _ndjson_chunk(columns, rows):
+    return "".join(to_json(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+def estimate_export_rows(cur, dataset, shop_id):
+    """The planner's row estimate for an export; only plans the query, so it is approximate."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + EXPORT_QUERIES[dataset], (shop_id,))
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+def iter_export(dataset, fmt, shop_id, on_rows=None):
+    """Yields the export as text chunks, holding at most one fetch of rows in memory.
+
+    on_rows, if given, is called with the number of rows in each chunk.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(name=f"export_{dataset}")
+    try:
+        cur.execute(EXPORT_QUERIES[dataset], (shop_id,))
+        rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+        columns = [col[0] for col in cur.description]
+        if fmt == 'csv':
+            yield _csv_chunk([columns])
+        while rows:
+            yield _csv_chunk(rows) if fmt == 'csv' else _ndjson_chunk(columns, rows)
+            if on_rows:
+                on_rows(len(rows))
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+    finally:
+        cur.close()
+        conn.close()
+
+
+@export_bp.route('/api/export/<string:dataset>', methods=['GET'])
+@token_required
+@shop_required
+def export_dataset(current_user_id, shop, dataset):
+    fmt = request.args.get('format', 'csv').lower()
+    if dataset not in EXPORT_QUERIES:
+        return jsonify({"error": f"Unknown export '{dataset}'. Choose one of: {', '.join(EXPORT_QUERIES)}"}), 404
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(iter_export(dataset, fmt, shop.id)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -1,34 +1,124 @@
 # utils.py
-from db import get_db_connection
+import base64
+import json
+import os
+from collections import namedtuple
+from flask import request, make_response
+from cache import TTLCache
+from db import get_db_connection, fetch_dicts
 
-def fetch_items(user_id):
+Shop = namedtuple('Shop', ['id', 'name'])
+
+# Only hits are cached, so a shop created on another worker is picked up
+# on that user's next request.
+_shop_cache = TTLCache(
+    maxsize=int(os.getenv('SHOP_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('SHOP_CACHE_TTL', '300')),
+)
+
+
+def get_shop(user_id):
+    """Returns the user's Shop(id, name), or None if they have not registered one."""
+    shop = _shop_cache.get(user_id)
+    if shop is not None:
+        return shop
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return ("No shop is registered with this user.") 
-        shop_id = shop_record[0]
-
-        cur.execute(
-            "SELECT id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit "
-            "FROM items WHERE shop_id=%s AND is_delete = 0;", (shop_id,)
-        )
-        items = cur.fetchall()
-
-        items_list = [{
-            "id": item[0],
-            "name": item[1],
-            "description": item[2],
-            "cost_price": float(item[3]) if item[3] is not None else None,
-            "wholesale_price": float(item[4]) if item[4] is not None else None,
-            "retail_price": float(item[5]) if item[5] is not None else None,
-            "stock_quantity": float(item[6]),
-            "si_unit": item[7]
-        } for item in items]
-
-        return items_list
+        cur.execute("SELECT id, name FROM shop WHERE user_id = %s LIMIT 1;", (user_id,))
+        row = cur.fetchone()
     finally:
         cur.close()
         conn.close()
+    if not row:
+        return None
+    shop = Shop(row[0], row[1])
+    _shop_cache.set(user_id, shop)
+    return shop
+
+
+def invalidate_shop(user_id):
+    _shop_cache.pop(user_id)
+
+
+ITEM_COLUMNS = "id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit"
+ITEM_FIELDS = {column: column for column in ITEM_COLUMNS.split(", ")}
+
+
+def select_fields(fields_arg, columns, required=('id',)):
+    """Builds the SELECT list for a `?fields=a,b` projection.
+
+    `columns` maps each response field to its SQL expression, in response
+    order; the `required` fields are always selected. Without a projection
+    every column is returned. Raises ValueError for unknown fields.
+    """
+    if not fields_arg:
+        return ", ".join(columns.values())
+    requested = {field.strip() for field in fields_arg.split(',') if field.strip()}
+    unknown = requested - columns.keys()
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return ", ".join(expr for field, expr in columns.items() if field in requested or field in required)
+
+
+def fetch_items(cur, shop_id):
+    cur.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE shop_id=%s AND is_delete = 0;", (shop_id,))
+    return fetch_dicts(cur)
+
+
+def get_catalog_version(cur, shop_id):
+    cur.execute("SELECT version FROM catalog_versions WHERE shop_id = %s;", (shop_id,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def get_search_version(cur, shop_id):
+    cur.execute("SELECT search_version FROM catalog_versions WHERE shop_id = %s;", (shop_id,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def bump_catalog_version(cur, shop_id, search=False):
+    """Marks the shop's catalog as changed; commits with the caller's transaction.
+
+    Writes that add, remove or rename items pass search=True to also bump the
+    search version the item search index is keyed on. Returns the new search
+    version.
+    """
+    cur.execute("""
+        INSERT INTO catalog_versions (shop_id, version, search_version) VALUES (%s, 1, %s)
+        ON CONFLICT (shop_id) DO UPDATE SET
+            version = catalog_versions.version + 1,
+            search_version = catalog_versions.search_version + EXCLUDED.search_version
+        RETURNING search_version;
+    """, (shop_id, 1 if search else 0))
+    return cur.fetchone()[0]
+
+
+def catalog_etag(cur, shop_id, variant):
+    """ETag for one view (`variant`) of the shop's catalog at its current version."""
+    return f"{variant}-{shop_id}-{get_catalog_version(cur, shop_id)}"
+
+
+def not_modified(etag):
+    """Returns a 304 response if the client already holds `etag`, else None."""
+    if request.if_none_match.contains_weak(etag):
+        return with_etag(make_response("", 304), etag)
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    # Let clients keep the body but revalidate it on every use.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def encode_cursor(values):
+    """Packs keyset pagination values into an opaque, URL-safe token."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed token."""
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
@@ -0,0 +1,23 @@
+"""Gunicorn settings; gunicorn loads this file from the working directory.
+
+Workers share their Prometheus metrics through files in
+PROMETHEUS_MULTIPROC_DIR, so /metrics reports the whole server whichever
+worker answers the scrape.
+"""
+import os
+import shutil
+
+METRICS_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(os.getenv('TMPDIR', '/tmp'), 'inventory-metrics')
+)
+
+
+def on_starting(server):
+    # Series left by a previous server would be added to this one's.
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
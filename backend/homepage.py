@@ -1,24 +1,44 @@
+from datetime import date
 from flask import Blueprint, request, jsonify
 from db import get_db_connection
-from decorators import token_required
+from decorators import token_required, shop_required, read_replica
+from functions import get_shop
+from rollups import sales_summary
 homepage_bp = Blueprint('homepage', __name__)
 @homepage_bp.route('/api/homepage', methods=['GET'])
 @token_required
 def get_shop_name(current_user_id):
-    conn=get_db_connection()
-    cur=conn.cursor()
     try:
-        cur.execute("SELECT id from shop where user_id=%s;",(current_user_id,))
-        shop_record=cur.fetchone()
-        if shop_record:
-            shop_id=shop_record[0]
-            cur.execute("SELECT name from shop where id=%s;",(shop_id,))
-            shop_name=cur.fetchone()[0]
-            return jsonify({"shopName":shop_name}),200
+        shop=get_shop(current_user_id)
+        if shop:
+            return jsonify({"shopName":shop.name}),200
         else:
             return jsonify({"shopName":None,"message":"No shop associated with this user.Please register your shop"}),404
     except Exception as e:
         return jsonify({"error":str(e)}),500
+
+@homepage_bp.route('/api/dashboard', methods=['GET'])
+@token_required
+@shop_required
+@read_replica
+def get_dashboard(current_user_id, shop):
+    """Sales totals and a per-day series for from..to (YYYY-MM-DD), defaulting to this month."""
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else today.replace(day=1)
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else today
+    except ValueError:
+        return jsonify({"error": "from and to must be dates in YYYY-MM-DD format"}), 400
+    if start > end:
+        return jsonify({"error": "from must not be after to"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        totals, days = sales_summary(cur, shop.id, start, end)
+        return jsonify({"from": start.isoformat(), "to": end.isoformat(), "totals": totals, "days": days}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -0,0 +1,183 @@
+"""Bulk item import: stream an upload into a staging table with COPY,
+validate it set-wise, then merge it into items in one statement."""
+import csv
+import io
+import json
+
+IMPORT_COLUMNS = ('name', 'description', 'cost_price', 'wholesale_price', 'retail_price', 'stock_quantity', 'si_unit')
+NUMERIC_COLUMNS = ('cost_price', 'wholesale_price', 'retail_price', 'stock_quantity')
+NUMERIC_PATTERN = r'^\s*[-+]?([0-9]+(\.[0-9]*)?|\.[0-9]+)\s*$'
+# Errors returned inline; the full count is always reported.
+MAX_REPORTED_ERRORS = 1000
+
+
+class _LineStream(io.TextIOBase):
+    """File-like wrapper over an iterator of text lines, as copy_expert expects."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _csv_records(text_stream):
+    reader = csv.DictReader(text_stream)
+    for record in reader:
+        yield reader.line_num, record, None
+
+
+def _ndjson_records(text_stream):
+    for line_no, line in enumerate(text_stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        yield line_no, record, None
+
+
+def _staging_lines(records, parse_errors):
+    """Turns parsed records into CSV lines for COPY, collecting unparseable lines."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for line_no, record, error in records:
+        if error:
+            parse_errors.append({"line": line_no, "error": error})
+            continue
+        values = []
+        for column in IMPORT_COLUMNS:
+            value = record.get(column)
+            # Blank cells are written unquoted, which COPY reads as NULL.
+            values.append(None if value is None or str(value).strip() == "" else str(value))
+        writer.writerow([line_no, *values])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def _numeric_checks(cur):
+    """CASE branches rejecting non-numbers, negatives and values too large for the items columns.
+
+    Bounds come from the columns' declared precision and scale, so a value
+    that would overflow fails its own row instead of the whole merge.
+    """
+    cur.execute("""
+        SELECT column_name, numeric_precision, numeric_scale
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'items' AND column_name = ANY(%s);
+    """, (list(NUMERIC_COLUMNS),))
+    limits = {column: (precision, scale) for column, precision, scale in cur.fetchall()}
+    checks = []
+    for column in NUMERIC_COLUMNS:
+        checks.append(f"WHEN {column} IS NOT NULL AND {column} !~ %(numeric)s THEN '{column} must be a number'")
+        checks.append(f"WHEN {column}::numeric < 0 THEN '{column} cannot be negative'")
+        precision, scale = limits.get(column, (None, None))
+        if precision is not None:
+            bound = 10 ** (precision - scale)
+            checks.append(
+                f"WHEN round({column}::numeric, {scale}) >= {bound} THEN '{column} must be less than {bound}'"
+            )
+    return "\n".join(checks)
+
+
+def import_items(cur, shop_id, text_stream, fmt, progress=None):
+    """Imports a CSV (with a header row) or NDJSON stream of items into the shop.
+
+    Rows merge into the shop's active items by name: existing items are
+    updated, new names are inserted. Returns a summary dict with
+    inserted/updated counts and a per-line error report. progress, if
+    given, is called as progress(fraction, message) as each stage starts.
+    """
+    progress = progress or (lambda fraction, message: None)
+    records = _csv_records(text_stream) if fmt == 'csv' else _ndjson_records(text_stream)
+    parse_errors = []
+
+    cur.execute(f"""
+        CREATE TEMP TABLE item_import (
+            line_no INTEGER,
+            {", ".join(f"{column} TEXT" for column in IMPORT_COLUMNS)},
+            error TEXT
+        ) ON COMMIT DROP;
+    """)
+    cur.copy_expert(
+        f"COPY item_import (line_no, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        _LineStream(_staging_lines(records, parse_errors)),
+    )
+
+    progress(0.6, "Validating rows")
+
+    # Set-wise validation: the first failing rule per row is recorded.
+    numeric_checks = _numeric_checks(cur)
+    cur.execute(f"""
+        UPDATE item_import SET error = CASE
+            WHEN name IS NULL OR btrim(name) = '' THEN 'name is required'
+            WHEN retail_price IS NULL THEN 'retail_price is required'
+            {numeric_checks}
+        END;
+    """, {"numeric": NUMERIC_PATTERN})
+    cur.execute("SELECT line_no, error FROM item_import WHERE error IS NOT NULL ORDER BY line_no;")
+    errors = parse_errors + [{"line": line_no, "error": error} for line_no, error in cur.fetchall()]
+    errors.sort(key=lambda e: e["line"])
+
+    progress(0.8, f"Merging items, {len(errors)} rows rejected")
+
+    # The last line wins when a name repeats within the file.
+    cur.execute("""
+        WITH src AS (
+            SELECT DISTINCT ON (btrim(name))
+                   btrim(name) AS name, description,
+                   cost_price::numeric AS cost_price,
+                   wholesale_price::numeric AS wholesale_price,
+                   retail_price::numeric AS retail_price,
+                   stock_quantity::numeric AS stock_quantity,
+                   si_unit
+            FROM item_import
+            WHERE error IS NULL
+            ORDER BY btrim(name), line_no DESC
+        ), updated AS (
+            UPDATE items i SET
+                description = COALESCE(src.description, i.description),
+                cost_price = COALESCE(src.cost_price, i.cost_price),
+                wholesale_price = COALESCE(src.wholesale_price, i.wholesale_price),
+                retail_price = src.retail_price,
+                stock_quantity = COALESCE(src.stock_quantity, i.stock_quantity),
+                si_unit = COALESCE(src.si_unit, i.si_unit)
+            FROM src
+            WHERE i.shop_id = %(shop_id)s AND i.is_delete = 0 AND i.name = src.name
+            RETURNING i.name
+        ), inserted AS (
+            INSERT INTO items (shop_id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit)
+            SELECT %(shop_id)s, src.name, src.description, src.cost_price, src.wholesale_price,
+                   src.retail_price, COALESCE(src.stock_quantity, 0), src.si_unit
+            FROM src
+            WHERE src.name NOT IN (SELECT name FROM updated)
+            RETURNING id
+        )
+        SELECT (SELECT COUNT(DISTINCT name) FROM updated), (SELECT COUNT(*) FROM inserted);
+    """, {"shop_id": shop_id})
+    updated, inserted = cur.fetchone()
+
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "error_count": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+    }
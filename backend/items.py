@@ -1,33 +1,47 @@
+import io
+from decimal import Decimal
+from uuid import UUID
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from decorators import token_required
+from db import get_db_connection, fetch_dicts, fetch_dict
+from decorators import token_required, shop_required, read_replica
+from functions import (
+    bump_catalog_version, catalog_etag, not_modified, with_etag,
+    fetch_items, get_search_version, ITEM_COLUMNS, ITEM_FIELDS, select_fields,
+)
+from item_import import import_items
+from stock import (
+    apply_stock_deltas, reorder_suggestions,
+    REORDER_WINDOW_DAYS, REORDER_COVER_DAYS, REORDER_TARGET_DAYS,
+)
+from search import (
+    get_index, search_items, index_upsert, index_remove,
+    SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT,
+)
 
 items_bp = Blueprint('items', __name__)
 
 @items_bp.route('/api/items', methods=['GET'])
 @token_required
-def get_items(current_user_id):
+@shop_required
+@read_replica
+def get_items(current_user_id, shop):
+    """The shop's active items; `?fields=id,name,...` selects only those columns."""
+    fields = request.args.get('fields', '')
+    try:
+        columns = select_fields(fields, ITEM_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user. Please register your shop."}), 404
-        shop_id = shop_record[0]
-        cur.execute("SELECT id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit FROM items WHERE shop_id=%s and is_delete=0;", (shop_id,))
-        items = cur.fetchall()
-        items_list = [{
-            "id": item[0],
-            "name": item[1],
-            "description": item[2],
-            "cost_price": str(item[3]) if item[3] is not None else None,
-            "wholesale_price": str(item[4]) if item[4] is not None else None,
-            "retail_price": str(item[5]) if item[5] is not None else None,
-            "stock_quantity": item[6],
-            "si_unit": item[7]
-        } for item in items]
-        return jsonify({"items": items_list}), 200
+        etag = catalog_etag(cur, shop.id, "items:" + columns.replace(", ", ",") if fields else "items")
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        cur.execute(f"SELECT {columns} FROM items WHERE shop_id=%s and is_delete=0;", (shop.id,))
+        items_list = fetch_dicts(cur)
+        return with_etag(jsonify({"items": items_list}), etag), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -36,7 +50,8 @@ def get_items(current_user_id):
 
 @items_bp.route('/api/create-items', methods=['POST'])
 @token_required
-def create_item(current_user_id):
+@shop_required
+def create_item(current_user_id, shop):
     data = request.get_json()
     name = data.get('name')
     description = data.get('description')
@@ -56,16 +71,14 @@ def create_item(current_user_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user. Please register your shop."}), 404
-        shop_id = shop_record[0]
         cur.execute(
-            "INSERT INTO items (shop_id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);",
-            (shop_id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit)
+            f"INSERT INTO items (shop_id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING {ITEM_COLUMNS};",
+            (shop.id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit)
         )
+        item = fetch_dict(cur)
+        version = bump_catalog_version(cur, shop.id, search=True)
         conn.commit()
+        index_upsert(shop.id, version, item)
         return jsonify({"message": "Item created successfully"}), 201
     except Exception as e:
         conn.rollback()
@@ -95,20 +108,29 @@ def update_item(current_user_id, item_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT shop.user_id FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
+        cur.execute("SELECT shop.user_id, items.shop_id FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
         item_owner_record = cur.fetchone()
         if not item_owner_record or item_owner_record[0] != current_user_id:
             return jsonify({"error": "Unauthorized"}), 403
         
         cur.execute(
-            '''
+            f'''
             UPDATE items 
             SET name = %s, description = %s, cost_price = %s, wholesale_price = %s, retail_price = %s, stock_quantity = %s, si_unit = %s
-            WHERE id = %s;
+            WHERE id = %s
+            RETURNING {ITEM_COLUMNS}, is_delete;
             ''',
             (name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit, item_id)
         )
+        item = fetch_dict(cur)
+        is_deleted = item.pop('is_delete')
+        shop_id = item_owner_record[1]
+        version = bump_catalog_version(cur, shop_id, search=True)
         conn.commit()
+        if is_deleted == 0:
+            index_upsert(shop_id, version, item)
+        else:
+            index_remove(shop_id, version, item_id)
         return jsonify({"message": "Item updated successfully"}), 200
     except Exception as e:
         conn.rollback()
@@ -123,15 +145,18 @@ def delete_item(current_user_id, item_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT shop.user_id FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
+        cur.execute("SELECT shop.user_id, items.shop_id FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
         item_owner_record = cur.fetchone()
         if not item_owner_record or item_owner_record[0] != current_user_id:
             return jsonify({"error": "Unauthorized"}), 403
 
         cur.execute("UPDATE items SET is_delete = 1 WHERE id = %s;", (item_id,))
+        updated = cur.rowcount
+        version = bump_catalog_version(cur, item_owner_record[1], search=True)
         conn.commit()
+        index_remove(item_owner_record[1], version, item_id)
         
-        if cur.rowcount == 0:
+        if updated == 0:
             return jsonify({"error": "Item not found"}), 404
 
         return jsonify({"message": "Item deleted successfully"}), 200
@@ -144,7 +169,8 @@ def delete_item(current_user_id, item_id):
 
 @items_bp.route('/api/items/<string:item_id>/stock', methods=['PATCH'])
 @token_required
-def update_stock(current_user_id, item_id):
+@shop_required
+def update_stock(current_user_id, shop, item_id):
     data = request.get_json()
     action = data.get('action')
 
@@ -154,21 +180,16 @@ def update_stock(current_user_id, item_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT shop.user_id, items.stock_quantity FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
-        record = cur.fetchone()
-        if not record or record[0] != current_user_id:
-            return jsonify({"error": "Unauthorized"}), 403
-        
-        current_stock = record[1]
-        
-        if action == 'increment':
-            new_stock = current_stock + 1
-        else: # decrement
-            if current_stock <= 0:
-                return jsonify({"error": "Stock cannot be less than zero"}), 400
-            new_stock = current_stock - 1
-
-        cur.execute("UPDATE items SET stock_quantity = %s WHERE id = %s;", (new_stock, item_id))
+        # Increment in the database so concurrent clicks are never lost
+        updated, failures = apply_stock_deltas(cur, shop.id, {item_id: 1 if action == 'increment' else -1})
+        if failures:
+            conn.rollback()
+            if failures[0]["error"] == "Item not found":
+                return jsonify({"error": "Unauthorized"}), 403
+            return jsonify({"error": failures[0]["error"]}), 400
+
+        new_stock = updated[str(item_id)]
+        bump_catalog_version(cur, shop.id)
         conn.commit()
 
         return jsonify({"message": "Stock updated successfully", "new_stock_quantity": new_stock}), 200
@@ -179,30 +200,68 @@ def update_stock(current_user_id, item_id):
         cur.close()
         conn.close()
 
+@items_bp.route('/api/items/stock', methods=['PATCH'])
+@token_required
+@shop_required
+def adjust_stock_batch(current_user_id, shop):
+    """Applies signed stock deltas to many items atomically.
+
+    Body: {"adjustments": [{"id": ..., "delta": ...}, ...], "allowNegative": false}.
+    Deltas for the same item are summed. Either every adjustment applies or
+    none does; failures are reported together with a 409.
+    """
+    data = request.get_json() or {}
+    adjustments = data.get('adjustments')
+    allow_negative = bool(data.get('allowNegative', False))
+    if not adjustments or not isinstance(adjustments, list):
+        return jsonify({"error": "adjustments must be a non-empty list"}), 400
+
+    deltas = {}
+    try:
+        for adjustment in adjustments:
+            item_id = str(UUID(str(adjustment['id'])))
+            delta = Decimal(str(adjustment['delta']))
+            # NaN would pass the stock >= 0 guard in Postgres, and Infinity overflows numeric
+            if not delta.is_finite():
+                raise ValueError(delta)
+            deltas[item_id] = deltas.get(item_id, Decimal(0)) + delta
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return jsonify({"error": "Each adjustment needs an item id and a finite numeric delta"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        updated, failures = apply_stock_deltas(cur, shop.id, deltas, allow_negative)
+        if failures:
+            conn.rollback()
+            return jsonify({"error": "Stock was not adjusted", "failures": failures}), 409
+
+        bump_catalog_version(cur, shop.id)
+        conn.commit()
+
+        return jsonify({"items": [{"id": item_id, "stock_quantity": quantity} for item_id, quantity in updated.items()]}), 200
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
 @items_bp.route('/api/items/deleted', methods=['GET'])
 @token_required
-def get_deleted_items(current_user_id):
+@shop_required
+@read_replica
+def get_deleted_items(current_user_id, shop):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM shop WHERE user_id = %s;", (current_user_id,))
-        shop_record = cur.fetchone()
-        if not shop_record:
-            return jsonify({"error": "No shop associated with this user. Please register your shop."}), 404
-        shop_id = shop_record[0]
-        cur.execute("SELECT id, name, description, cost_price, wholesale_price, retail_price, stock_quantity, si_unit FROM items WHERE shop_id=%s AND is_delete=1;", (shop_id,))
-        items = cur.fetchall()
-        items_list = [{
-            "id": item[0],
-            "name": item[1],
-            "description": item[2],
-            "cost_price": str(item[3]) if item[3] is not None else None,
-            "wholesale_price": str(item[4]) if item[4] is not None else None,
-            "retail_price": str(item[5]) if item[5] is not None else None,
-            "stock_quantity": item[6],
-            "si_unit": item[7]
-        } for item in items]
-        return jsonify({"items": items_list}), 200
+        etag = catalog_etag(cur, shop.id, "deleted-items")
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        cur.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE shop_id=%s AND is_delete=1;", (shop.id,))
+        items_list = fetch_dicts(cur)
+        return with_etag(jsonify({"items": items_list}), etag), 200
     except Exception as e:
         conn.rollback() # This rollback is not strictly necessary for a GET, but harmless.
         return jsonify({"error": str(e)}), 500
@@ -216,15 +275,20 @@ def restore_item(current_user_id, item_id):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT shop.user_id FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
+        cur.execute("SELECT shop.user_id, items.shop_id FROM items JOIN shop ON items.shop_id = shop.id WHERE items.id = %s;", (item_id,))
         item_owner_record = cur.fetchone()
         if not item_owner_record or item_owner_record[0] != current_user_id:
             return jsonify({"error": "Unauthorized"}), 403
 
-        cur.execute("UPDATE items SET is_delete = 0 WHERE id = %s;", (item_id,))
+        cur.execute(f"UPDATE items SET is_delete = 0 WHERE id = %s RETURNING {ITEM_COLUMNS};", (item_id,))
+        item = fetch_dict(cur)
+        updated = cur.rowcount
+        version = bump_catalog_version(cur, item_owner_record[1], search=True)
         conn.commit()
+        if item:
+            index_upsert(item_owner_record[1], version, item)
         
-        if cur.rowcount == 0:
+        if updated == 0:
             return jsonify({"error": "Item not found"}), 404
 
         return jsonify({"message": "Item restored successfully"}), 200
@@ -233,4 +297,104 @@ def restore_item(current_user_id, item_id):
         return jsonify({"error": str(e)}), 500
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+@items_bp.route('/api/items/search', methods=['GET'])
+@token_required
+@shop_required
+def search_catalog(current_user_id, shop):
+    """Typeahead over active items by name or description, best matches first."""
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({"error": "A search query (q) is required"}), 400
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        version = get_search_version(cur, shop.id)
+        index = get_index(shop.id, version, lambda: fetch_items(cur, shop.id))
+        item_ids = search_items(index, query, limit)
+        # Prices and stock come from the rows, not the index, so they are never stale
+        cur.execute(
+            f"SELECT {ITEM_COLUMNS} FROM items WHERE id = ANY(%s::uuid[]) AND shop_id = %s AND is_delete = 0;",
+            (item_ids, shop.id)
+        )
+        rows = {str(item['id']): item for item in fetch_dicts(cur)}
+        return jsonify({"items": [rows[item_id] for item_id in item_ids if item_id in rows]}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@items_bp.route('/api/items/reorder', methods=['GET'])
+@token_required
+@shop_required
+@read_replica
+def get_reorder_suggestions(current_user_id, shop):
+    """Items with fewer than `cover_days` of stock left at their recent sales rate.
+
+    Optional: window (days of sales to average, max 365), cover_days and
+    target_days (cover to restock up to).
+    """
+    try:
+        window = int(request.args.get('window', REORDER_WINDOW_DAYS))
+        cover_days = float(request.args.get('cover_days', REORDER_COVER_DAYS))
+        target_days = float(request.args.get('target_days', REORDER_TARGET_DAYS))
+        if not 1 <= window <= 365 or cover_days <= 0 or target_days <= 0:
+            raise ValueError("window must be 1-365 and cover_days, target_days positive")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        items = reorder_suggestions(cur, shop.id, window, cover_days, target_days)
+        return jsonify({"window": window, "cover_days": cover_days, "items": items}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@items_bp.route('/api/items/import', methods=['POST'])
+@token_required
+@shop_required
+def import_catalog(current_user_id, shop):
+    """Bulk-imports items from an uploaded CSV (header row) or NDJSON file.
+
+    Send the file as multipart field `file` or as the raw request body;
+    the format comes from `?format=`, the file extension, or the content type.
+    """
+    upload = request.files.get('file')
+    filename = (upload.filename if upload else '') or ''
+    content_type = upload.mimetype if upload else (request.mimetype or '')
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type else 'csv'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    raw = upload.stream if upload else request.stream
+    text_stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        summary = import_items(cur, shop.id, text_stream, fmt)
+        if summary["inserted"] or summary["updated"]:
+            bump_catalog_version(cur, shop.id, search=True)
+        conn.commit()
+        return jsonify(summary), 200
+    except UnicodeDecodeError:
+        conn.rollback()
+        return jsonify({"error": "The file must be UTF-8 encoded"}), 400
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,492 @@
+"""Background jobs for work too slow for a request: exports, imports,
+reports and rollup backfills.
+
+Jobs are rows in the jobs table. The API enqueues them and
+`python jobs.py worker` runs them on a pool of processes, each claiming
+one job at a time with FOR UPDATE SKIP LOCKED.
+
+    python jobs.py worker [processes]    run jobs until stopped
+"""
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import multiprocessing
+from datetime import date, datetime
+from decimal import Decimal
+import psycopg2
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from config import DATABASE_URL
+from db import get_db_connection, fetch_dict
+from decorators import token_required, shop_required
+from export import EXPORT_QUERIES, EXPORT_FORMATS, estimate_export_rows, iter_export
+from functions import bump_catalog_version
+from item_import import import_items
+from reports import REPORTS, report_window, report_args
+from rollups import backfill
+
+jobs_bp = Blueprint('jobs', __name__)
+
+JOB_WORKER_PROCESSES = int(os.getenv('JOB_WORKER_PROCESSES', '2'))
+# Seconds an idle worker waits before looking for new jobs again.
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+# A running job not heard from in this many seconds is presumed dead and re-run.
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '900'))
+# How often a running job renews its lease, whatever the job itself is doing.
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', str(min(60.0, JOB_LEASE_SECONDS / 3))))
+# Progress updates closer together than this many seconds are dropped.
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '1'))
+# Result files are read back from their large objects in chunks of this size.
+JOB_RESULT_CHUNK_BYTES = 256 * 1024
+# Failed attempts are retried after JOB_RETRY_DELAY * 2^(attempt - 1) seconds.
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', '30'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Largest import file accepted for a background import.
+JOB_MAX_INPUT_BYTES = int(os.getenv('JOB_MAX_INPUT_BYTES', str(50 * 1024 * 1024)))
+
+JOB_STATUS_COLUMNS = """
+    id, kind, params, status, attempts, max_attempts, progress, progress_message,
+    error, result, result_oid IS NOT NULL AS has_download,
+    created_at, started_at, finished_at
+"""
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    return str(obj)
+
+
+class _Heartbeat(threading.Thread):
+    """Renews a running job's lease every JOB_HEARTBEAT_INTERVAL seconds until stopped.
+
+    Jobs that spend minutes in one statement report no progress meanwhile;
+    without this their lease would lapse and another worker would run them
+    a second time.
+    """
+
+    def __init__(self, job_id, worker_id):
+        super().__init__(name=f"job-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self._stopped = threading.Event()
+
+    def run(self):
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.autocommit = True
+            cur = conn.cursor()
+            while not self._stopped.wait(JOB_HEARTBEAT_INTERVAL):
+                cur.execute(
+                    "UPDATE jobs SET locked_at = now() WHERE id = %s AND locked_by = %s;",
+                    (self.job_id, self.worker_id)
+                )
+        except psycopg2.Error as e:
+            print(f"Job {self.job_id} heartbeat stopped: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class JobContext:
+    """What a running job sees: its row, a work cursor and a progress reporter.
+
+    Progress goes through a separate autocommit connection so it is visible
+    while the job's own transaction is still open.
+    """
+
+    def __init__(self, job, conn, status_conn):
+        self.id = job['id']
+        self.shop_id = job['shop_id']
+        self.params = job['params']
+        self.input_data = job['input_data']
+        self.conn = conn
+        self.cur = conn.cursor()
+        self._status_conn = status_conn
+        self._progress_at = None
+        self.result_file = None
+        self.result_mimetype = None
+        self.result_filename = None
+
+    def progress(self, fraction, message=None):
+        now = time.monotonic()
+        if self._progress_at is not None and now - self._progress_at < JOB_PROGRESS_INTERVAL:
+            return
+        self._progress_at = now
+        cur = self._status_conn.cursor()
+        try:
+            cur.execute(
+                "UPDATE jobs SET progress = %s, progress_message = %s, locked_at = now() WHERE id = %s;",
+                (min(max(fraction, 0.0), 1.0), message, self.id)
+            )
+        finally:
+            cur.close()
+
+    def open_result(self, mimetype, filename):
+        """Starts the file downloadable from /api/jobs/<id>/result and returns it for writing.
+
+        The file is a large object created in the job's transaction, so it
+        is written in pieces rather than held in memory, and a failed
+        attempt leaves nothing behind.
+        """
+        self.result_file = self.conn.lobject(0, 'wb')
+        self.result_mimetype = mimetype
+        self.result_filename = filename
+        return self.result_file
+
+
+class _ProgressReader(io.BytesIO):
+    """An in-memory upload that reports how much of it has been read."""
+
+    def __init__(self, data, report):
+        super().__init__(data)
+        self._size = len(data) or 1
+        self._report = report
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self._report(self.tell() / self._size)
+        return chunk
+
+    def read1(self, size=-1):
+        chunk = super().read1(size)
+        self._report(self.tell() / self._size)
+        return chunk
+
+
+def run_export(ctx):
+    dataset, fmt = ctx.params['dataset'], ctx.params['format']
+    # Counting the rows would scan the data twice, so progress runs against
+    # the planner's estimate and holds below 100% until the last row is out.
+    estimate = estimate_export_rows(ctx.cur, dataset, ctx.shop_id)
+    exported = 0
+
+    def on_rows(count):
+        nonlocal exported
+        exported += count
+        ctx.progress(min(0.99, exported / max(estimate, exported + 1)), f"{exported} rows exported")
+
+    out = ctx.open_result(EXPORT_FORMATS[fmt], f"{dataset}-{datetime.utcnow():%Y%m%d}.{fmt}")
+    written = 0
+    for chunk in iter_export(dataset, fmt, ctx.shop_id, on_rows):
+        written += out.write(chunk.encode('utf-8'))
+    out.close()
+    ctx.progress(1.0, f"{exported} rows exported")
+    return {"rows": exported, "bytes": written}
+
+
+def run_import(ctx):
+    # Reading the file is the staging stage, the first 60% of the import.
+    data = _ProgressReader(bytes(ctx.input_data), lambda read: ctx.progress(0.6 * read, "Reading the file"))
+    text_stream = io.TextIOWrapper(data, encoding='utf-8-sig', newline='')
+    summary = import_items(ctx.cur, ctx.shop_id, text_stream, ctx.params['format'], ctx.progress)
+    if summary["inserted"] or summary["updated"]:
+        bump_catalog_version(ctx.cur, ctx.shop_id, search=True)
+    return summary
+
+
+def run_report(ctx):
+    name = ctx.params['name']
+    start, end = report_window(ctx.params)
+    ctx.progress(0.1, f"Running the {name} report")
+    rows = REPORTS[name](ctx.cur, ctx.shop_id, start, end, report_args(name, ctx.params))
+    ctx.progress(0.9, f"{len(rows)} rows")
+    return {"from": start.isoformat(), "to": end.isoformat(), "rows": rows}
+
+
+def run_rollup_backfill(ctx):
+    return {"daily_rows": backfill(ctx.cur, ctx.shop_id, ctx.progress)}
+
+
+JOB_KINDS = {
+    'export': run_export,
+    'import': run_import,
+    'report': run_report,
+    'rollup_backfill': run_rollup_backfill,
+}
+
+
+def _validate_params(kind, params):
+    """Rejects bad parameters at enqueue time rather than on the first attempt."""
+    if kind == 'export':
+        if params.get('dataset') not in EXPORT_QUERIES:
+            raise ValueError(f"dataset must be one of: {', '.join(EXPORT_QUERIES)}")
+        params.setdefault('format', 'csv')
+        if params['format'] not in EXPORT_FORMATS:
+            raise ValueError("format must be csv or ndjson")
+    elif kind == 'import':
+        if params.get('format') not in ('csv', 'ndjson'):
+            raise ValueError("format must be csv or ndjson")
+    elif kind == 'report':
+        if params.get('name') not in REPORTS:
+            raise ValueError(f"name must be one of: {', '.join(REPORTS)}")
+        report_window(params)
+        report_args(params['name'], params)
+
+
+def enqueue(cur, shop_id, kind, params, input_data=None):
+    """Queues a job; it starts once the caller commits. Returns its id."""
+    cur.execute("""
+        INSERT INTO jobs (shop_id, kind, params, input_data, max_attempts)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id;
+    """, (shop_id, kind, json.dumps(params), input_data, JOB_MAX_ATTEMPTS))
+    return cur.fetchone()[0]
+
+
+def claim_job(cur, worker_id):
+    """Takes the next due job (or one whose lease expired) and marks it running."""
+    cur.execute("""
+        UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                        locked_by = %(worker)s, locked_at = now(),
+                        started_at = COALESCE(started_at, now())
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE (status = 'queued' AND run_after <= now())
+               OR (status = 'running' AND locked_at < now() - %(lease)s * interval '1 second')
+            ORDER BY run_after, created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, shop_id, kind, params, input_data, attempts, max_attempts, error;
+    """, {"worker": worker_id, "lease": JOB_LEASE_SECONDS})
+    return fetch_dict(cur)
+
+
+def _finish(cur, job_id, ctx, result):
+    cur.execute("""
+        UPDATE jobs SET status = 'succeeded', progress = 1, error = NULL, finished_at = now(),
+                        result = %s, result_mimetype = %s, result_filename = %s,
+                        input_data = NULL, locked_by = NULL
+        WHERE id = %s;
+    """, (json.dumps(result, default=_json_default), ctx.result_mimetype, ctx.result_filename, job_id))
+
+
+def _fail(cur, job, error):
+    """Requeues the job with exponential backoff, or fails it after its last attempt."""
+    if job['attempts'] < job['max_attempts']:
+        cur.execute("""
+            UPDATE jobs SET status = 'queued', error = %s, locked_by = NULL,
+                            run_after = now() + %s * interval '1 second'
+            WHERE id = %s;
+        """, (error, JOB_RETRY_DELAY * 2 ** (job['attempts'] - 1), job['id']))
+    else:
+        cur.execute("""
+            UPDATE jobs SET status = 'failed', error = %s, locked_by = NULL,
+                            input_data = NULL, finished_at = now()
+            WHERE id = %s;
+        """, (error, job['id']))
+
+
+def run_one(status_conn, worker_id):
+    """Claims and runs one job. Returns False when nothing was due."""
+    cur = status_conn.cursor()
+    try:
+        job = claim_job(cur, worker_id)
+        if job is None:
+            return False
+        if job['attempts'] > job['max_attempts']:
+            # Its lease expired on the final attempt: the worker running it died.
+            _fail(cur, job, job['error'] or "Worker stopped while running the job")
+            return True
+
+        conn = psycopg2.connect(DATABASE_URL)
+        ctx = JobContext(job, conn, status_conn)
+        heartbeat = _Heartbeat(job['id'], worker_id)
+        heartbeat.start()
+        try:
+            result = JOB_KINDS[job['kind']](ctx)
+            if ctx.result_file is not None:
+                # Saved with the work, so a re-run replaces the file rather
+                # than orphaning it; the jobs trigger unlinks the old one.
+                ctx.cur.execute("UPDATE jobs SET result_oid = %s WHERE id = %s;", (ctx.result_file.oid, job['id']))
+            # The work and the job's success commit separately; a crash in
+            # between re-runs the job, so every kind is safe to repeat.
+            conn.commit()
+            _finish(cur, job['id'], ctx, result)
+        except Exception as e:
+            conn.rollback()
+            print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {e}")
+            _fail(cur, job, str(e))
+        finally:
+            heartbeat.stop()
+            ctx.cur.close()
+            conn.close()
+        return True
+    finally:
+        cur.close()
+
+
+def _worker_loop(worker_id):
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    status_conn = psycopg2.connect(DATABASE_URL)
+    status_conn.autocommit = True
+    try:
+        while True:
+            if not run_one(status_conn, worker_id):
+                time.sleep(JOB_POLL_INTERVAL)
+    finally:
+        status_conn.close()
+
+
+def run_workers(processes):
+    """Keeps `processes` worker processes running until SIGTERM/SIGINT."""
+    host = socket.gethostname()
+    workers = {}
+
+    def stop(*_):
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while True:
+        for slot in range(processes):
+            process = workers.get(slot)
+            if process is None or not process.is_alive():
+                if process is not None:
+                    print(f"Job worker {slot} exited with {process.exitcode}; restarting")
+                process = multiprocessing.Process(
+                    target=_worker_loop, args=(f"{host}:{os.getpid()}:{slot}",), daemon=True
+                )
+                process.start()
+                workers[slot] = process
+        time.sleep(1)
+
+
+@jobs_bp.route('/api/jobs', methods=['POST'])
+@token_required
+@shop_required
+def create_job(current_user_id, shop):
+    """Queues a job and returns 202 with its id.
+
+    JSON body {"kind", "params"}; an import instead sends multipart with
+    `file`, `kind=import` and `format`. Kinds: export (dataset, format),
+    import, report (name, from, to, limit, by) and rollup_backfill.
+    """
+    upload = request.files.get('file')
+    if upload:
+        kind = request.form.get('kind', 'import')
+        params = {"format": request.form.get('format') or
+                  ('ndjson' if (upload.filename or '').endswith(('.ndjson', '.jsonl')) else 'csv')}
+    else:
+        data = request.get_json(silent=True) or {}
+        kind = data.get('kind')
+        params = data.get('params') or {}
+    if kind not in JOB_KINDS:
+        return jsonify({"error": f"kind must be one of: {', '.join(JOB_KINDS)}"}), 400
+    if not isinstance(params, dict):
+        return jsonify({"error": "params must be an object"}), 400
+
+    input_data = None
+    if kind == 'import':
+        if not upload:
+            return jsonify({"error": "An import needs the file uploaded as multipart field 'file'"}), 400
+        input_data = upload.stream.read(JOB_MAX_INPUT_BYTES + 1)
+        if len(input_data) > JOB_MAX_INPUT_BYTES:
+            return jsonify({"error": f"The file must be at most {JOB_MAX_INPUT_BYTES} bytes"}), 413
+    try:
+        _validate_params(kind, params)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid job parameter: {e}"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        job_id = enqueue(cur, shop.id, kind, params, psycopg2.Binary(input_data) if input_data else None)
+        conn.commit()
+        response = jsonify({"id": job_id, "status": "queued"})
+        response.headers['Location'] = f"/api/jobs/{job_id}"
+        return response, 202
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+@jobs_bp.route('/api/jobs/<string:job_id>', methods=['GET'])
+@token_required
+@shop_required
+def get_job(current_user_id, shop, job_id):
+    """Status, progress (0-1), attempts and, once succeeded, the job's result summary."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT {JOB_STATUS_COLUMNS} FROM jobs WHERE id = %s AND shop_id = %s;", (job_id, shop.id))
+        job = fetch_dict(cur)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _read_result(oid):
+    """Yields a job's result file from its large object, one chunk at a time."""
+    conn = get_db_connection()
+    try:
+        result_file = conn.lobject(oid, 'rb')
+        chunk = result_file.read(JOB_RESULT_CHUNK_BYTES)
+        while chunk:
+            yield chunk
+            chunk = result_file.read(JOB_RESULT_CHUNK_BYTES)
+        result_file.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@jobs_bp.route('/api/jobs/<string:job_id>/result', methods=['GET'])
+@token_required
+@shop_required
+def download_job_result(current_user_id, shop, job_id):
+    """The file a succeeded job produced (exports), or its JSON result."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT status, result, result_oid, result_mimetype, result_filename
+            FROM jobs WHERE id = %s AND shop_id = %s;
+        """, (job_id, shop.id))
+        row = fetch_dict(cur)
+        if not row:
+            return jsonify({"error": "Job not found"}), 404
+        if row['status'] != 'succeeded':
+            return jsonify({"error": f"Job is {row['status']}", "status": row['status']}), 409
+        if row['result_oid'] is None:
+            return jsonify(row['result']), 200
+        return Response(
+            stream_with_context(_read_result(row['result_oid'])),
+            mimetype=row['result_mimetype'],
+            headers={"Content-Disposition": f"attachment; filename={row['result_filename']}"},
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'worker':
+        sys.exit("Usage: python jobs.py worker [processes]")
+    run_workers(int(sys.argv[2]) if len(sys.argv) > 2 else JOB_WORKER_PROCESSES)
@@ -0,0 +1,128 @@
+"""Per-request database accounting and Prometheus text-format metrics.
+
+/metrics is answered by whichever gunicorn worker takes the scrape, so
+with PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py sets it and empties it
+at startup) every worker writes its series to prometheus_client's shared
+files and each scrape renders the sum across all of them. Without it (the
+dev server, tests) the metrics cover this process only.
+"""
+import os
+import time
+from flask import g, has_request_context, request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY as PROCESS_REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+from db import add_query_listener, pool_stats
+
+# Latency buckets in seconds; the top ones catch report and export requests.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+# Adds X-DB-Queries / X-DB-Time-Ms to every response when the app runs in debug mode or this is set.
+QUERY_HEADERS = os.getenv('DB_QUERY_HEADERS', '').lower() in ('1', 'true', 'yes')
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests served.', ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint',), buckets=LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database statements executed per request.', ('endpoint',),
+    buckets=QUERY_COUNT_BUCKETS
+)
+DB_TIME = Counter('db_query_duration_seconds_total', 'Time spent executing database statements.', ('endpoint',))
+DB_ROWS = Counter('db_rows_returned_total', 'Rows returned by database statements.', ('endpoint',))
+
+# Connection pool state, summed over the live workers.
+POOL_GAUGES = {
+    key: Gauge(f'db_pool_{key}', f'Pooled connections: {key}.', multiprocess_mode='livesum')
+    for key in ('in_use', 'idle', 'max_size')
+}
+POOL_COUNTERS = {
+    key: Counter(f'db_pool_{key}_total', f'Pool events: {key}.')
+    for key in ('waits', 'timeouts', 'created', 'discarded')
+}
+_pool_seen = dict.fromkeys(POOL_COUNTERS, 0)
+
+
+class RequestQueryStats:
+    """Database work done on behalf of the current request."""
+
+    __slots__ = ('queries', 'seconds', 'rows')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+
+def current_query_stats():
+    """The running RequestQueryStats, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return g.get('db_query_stats')
+
+
+def _on_query(sql, params, duration, rows):
+    stats = current_query_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += duration
+        stats.rows += rows
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _record_pool_stats():
+    """Copies this worker's pool state into the shared metrics."""
+    stats = pool_stats()
+    for key, gauge in POOL_GAUGES.items():
+        gauge.set(stats[key])
+    for key, counter in POOL_COUNTERS.items():
+        # The pool keeps running totals; a smaller one means it was recreated.
+        seen = _pool_seen[key]
+        counter.inc(stats[key] - seen if stats[key] >= seen else stats[key])
+        _pool_seen[key] = stats[key]
+
+
+def render_metrics():
+    _record_pool_stats()
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(PROCESS_REGISTRY)
+
+
+def init_app(app):
+    """Hooks request timing and query accounting into the app and serves GET /metrics."""
+    add_query_listener(_on_query)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.db_query_stats = RequestQueryStats()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        stats = g.get('db_query_stats')
+        if started is None or stats is None:
+            return response
+        endpoint = _endpoint()
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        REQUEST_QUERIES.labels(endpoint).observe(stats.queries)
+        DB_TIME.labels(endpoint).inc(stats.seconds)
+        DB_ROWS.labels(endpoint).inc(stats.rows)
+        if stats.queries:
+            _record_pool_stats()
+        if QUERY_HEADERS or app.debug:
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Time-Ms'] = f"{stats.seconds * 1000:.1f}"
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,126 @@
+"""Applies the versioned SQL files in migrations/ in order.
+
+    python migrate.py            apply pending migrations
+    python migrate.py status     list applied and pending versions
+
+A file whose first line is `-- migrate: no-transaction` runs one statement
+at a time in autocommit mode, which CREATE INDEX CONCURRENTLY requires;
+every other file runs in a single transaction. Migrations must be
+idempotent (IF NOT EXISTS) so a half-applied no-transaction file can be
+re-run.
+"""
+import os
+import re
+import sys
+import psycopg2
+from config import DATABASE_URL
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE
+)
+
+
+def list_migrations():
+    """Returns [(version, path), ...] sorted by version, e.g. ('0001', '.../0001_x.sql')."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            migrations.append((filename.split('_', 1)[0], os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    """Splits a migration into statements on semicolons that end a line."""
+    without_comments = "\n".join(
+        line for line in sql.splitlines() if not line.strip().startswith('--')
+    )
+    return [stmt.strip() for stmt in re.split(r';\s*$', without_comments, flags=re.MULTILINE) if stmt.strip()]
+
+
+def _drop_invalid_index(cur, statement):
+    """A failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS would skip."""
+    match = CONCURRENT_INDEX_RE.search(statement)
+    if not match:
+        return
+    cur.execute("""
+        SELECT 1 FROM pg_index ix JOIN pg_class c ON c.oid = ix.indexrelid
+        WHERE c.relname = %s AND NOT ix.indisvalid;
+    """, (match.group(1),))
+    if cur.fetchone():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)};")
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    cur.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migration(conn, version, path):
+    with open(path) as f:
+        sql = f.read()
+    cur = conn.cursor()
+    try:
+        if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+            conn.autocommit = True
+            for statement in split_statements(sql):
+                _drop_invalid_index(cur, statement)
+                cur.execute(statement)
+            conn.autocommit = False
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (version,))
+        else:
+            cur.execute(sql)
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (version,))
+        conn.commit()
+    except Exception:
+        conn.autocommit = False
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def migrate(dsn=DATABASE_URL):
+    conn = psycopg2.connect(dsn)
+    try:
+        cur = conn.cursor()
+        done = applied_versions(cur)
+        conn.commit()
+        cur.close()
+        for version, path in list_migrations():
+            if version in done:
+                continue
+            print(f"Applying {os.path.basename(path)}")
+            apply_migration(conn, version, path)
+    finally:
+        conn.close()
+
+
+def status(dsn=DATABASE_URL):
+    conn = psycopg2.connect(dsn)
+    try:
+        cur = conn.cursor()
+        done = applied_versions(cur)
+        conn.commit()
+        for version, path in list_migrations():
+            state = "applied" if version in done else "pending"
+            print(f"{state:8} {os.path.basename(path)}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'status':
+        status()
+    elif command == 'migrate':
+        migrate()
+    else:
+        sys.exit(f"Unknown command {command!r}; use 'migrate' or 'status'")
@@ -0,0 +1,31 @@
+-- migrate: no-transaction
+-- Indexes behind the per-request lookups. Built CONCURRENTLY so live
+-- shops keep writing while they are created.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shop_user_id_idx
+    ON shop (user_id);
+
+-- Item lookups filter on is_delete = 0 and almost every item is active, so
+-- active items get a partial index that also serves the import's by-name
+-- matching; the rarely listed deleted items get their own.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS items_shop_id_name_active_idx
+    ON items (shop_id, name) WHERE is_delete = 0;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS items_shop_id_deleted_idx
+    ON items (shop_id) WHERE is_delete = 1;
+
+-- Matches the bills page order and its (bill_date, id) keyset cursor.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bills_shop_id_bill_date_idx
+    ON bills (shop_id, bill_date DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bill_items_bill_id_idx
+    ON bill_items (bill_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_shop_id_phone_number_idx
+    ON customers (shop_id, phone_number);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_shop_id_name_active_idx
+    ON customers (shop_id, name) WHERE is_delete = 0;
+
+-- customer_item_prices(customer_id) needs no index of its own: the unique
+-- (customer_id, item_id) constraint used by the price upserts leads with it.
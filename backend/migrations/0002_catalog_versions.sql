@@ -0,0 +1,10 @@
+-- Counters per shop, bumped by every write that changes the item catalog
+-- or its stock levels. Item endpoints derive their ETag from `version`.
+-- `search_version` moves only on writes that add, remove or rename items;
+-- the item search index is keyed on it, so sales and stock adjustments do
+-- not force an index rebuild.
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    shop_id UUID PRIMARY KEY REFERENCES shop (id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0,
+    search_version BIGINT NOT NULL DEFAULT 0
+);
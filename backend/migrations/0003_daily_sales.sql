@@ -0,0 +1,11 @@
+-- Per-shop daily sales totals, kept current by the bill write paths in
+-- the same transaction as the bill. Rebuild with `python rollups.py backfill`.
+CREATE TABLE IF NOT EXISTS daily_sales (
+    shop_id UUID NOT NULL REFERENCES shop (id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    amount_paid NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    bill_count INTEGER NOT NULL DEFAULT 0,
+    items_sold NUMERIC(14, 3) NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day)
+);
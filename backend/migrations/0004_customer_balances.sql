@@ -0,0 +1,11 @@
+-- What each customer still owes across their bills (total - paid), kept
+-- current by the bill write paths. Check with `python receivables.py reconcile`.
+CREATE TABLE IF NOT EXISTS customer_balances (
+    customer_id UUID PRIMARY KEY REFERENCES customers (id) ON DELETE CASCADE,
+    shop_id UUID NOT NULL REFERENCES shop (id) ON DELETE CASCADE,
+    outstanding NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS customer_balances_shop_id_outstanding_idx
+    ON customer_balances (shop_id, outstanding DESC, customer_id DESC);
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- The customer-prices lookup matches on the trimmed phone number, which the
+-- plain (shop_id, phone_number) index cannot serve.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_shop_id_btrim_phone_idx
+    ON customers (shop_id, btrim(phone_number));
@@ -0,0 +1,6 @@
+-- One counter per shop, bumped by every bill write. Cached sales reports
+-- are keyed on it, so any new, edited or deleted bill invalidates them.
+CREATE TABLE IF NOT EXISTS sales_versions (
+    shop_id UUID PRIMARY KEY REFERENCES shop (id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,10 @@
+-- Units sold per item per day, kept current by the bill write paths
+-- alongside daily_sales. Backs the reorder suggestions' sales velocity;
+-- rebuilt by `python rollups.py backfill`.
+CREATE TABLE IF NOT EXISTS item_daily_sales (
+    shop_id UUID NOT NULL REFERENCES shop (id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    item_id UUID NOT NULL REFERENCES items (id) ON DELETE CASCADE,
+    quantity NUMERIC(14, 3) NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day, item_id)
+);
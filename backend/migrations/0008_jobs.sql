@@ -0,0 +1,56 @@
+-- Background jobs run by `python jobs.py worker`. Workers claim queued
+-- rows with FOR UPDATE SKIP LOCKED; a running job whose lease (locked_at,
+-- refreshed on progress) has expired is claimed again. Result files
+-- (exports) are large objects, written and read in chunks; the trigger
+-- unlinks a job's object when the row is deleted (shop deletes cascade
+-- here) or its result is replaced.
+CREATE TABLE IF NOT EXISTS jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    shop_id UUID NOT NULL REFERENCES shop (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}',
+    input_data BYTEA,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    progress REAL NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    error TEXT,
+    result JSONB,
+    result_oid OID,
+    result_mimetype TEXT,
+    result_filename TEXT,
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS jobs_queued_run_after_idx
+    ON jobs (run_after) WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS jobs_running_locked_at_idx
+    ON jobs (locked_at) WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS jobs_shop_id_created_at_idx
+    ON jobs (shop_id, created_at DESC);
+
+CREATE OR REPLACE FUNCTION jobs_unlink_result() RETURNS trigger AS $$
+BEGIN
+    IF OLD.result_oid IS NOT NULL
+       AND (TG_OP = 'DELETE' OR NEW.result_oid IS DISTINCT FROM OLD.result_oid) THEN
+        PERFORM lo_unlink(OLD.result_oid);
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS jobs_unlink_result ON jobs;
+CREATE TRIGGER jobs_unlink_result
+    BEFORE DELETE OR UPDATE OF result_oid ON jobs
+    FOR EACH ROW EXECUTE FUNCTION jobs_unlink_result();
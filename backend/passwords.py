@@ -0,0 +1,96 @@
+"""Password hashing under a host-wide cap on concurrent bcrypt calls.
+
+bcrypt runs inline on the request thread, which is tied up for the whole
+call either way. What matters is how many workers a login burst can take:
+at most PASSWORD_HASH_SLOTS hashes run at once on the host, across every
+gunicorn worker, each holding an flock on one of that many slot files.
+The default is one less than WEB_CONCURRENCY, so some worker is always
+left for other requests. Callers beyond the cap get HashingBusy
+immediately instead of piling up. Where fcntl is unavailable the cap is
+per process.
+"""
+import os
+import tempfile
+import threading
+import bcrypt
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the slots then only bound this process
+    fcntl = None
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+# gunicorn's worker count; with a single worker one slot is the best we can do.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+PASSWORD_HASH_SLOTS = int(os.getenv('PASSWORD_HASH_SLOTS', str(max(1, WEB_CONCURRENCY - 1))))
+PASSWORD_HASH_SLOT_DIR = os.getenv(
+    'PASSWORD_HASH_SLOT_DIR', os.path.join(tempfile.gettempdir(), 'inventory-password-slots')
+)
+
+
+class HashingBusy(Exception):
+    """Raised when every hashing slot is taken; callers should answer 503."""
+
+
+_local_slots = None
+_local_slots_lock = threading.Lock()
+
+
+def _process_slots():
+    """The per-process fallback cap when there are no flocks."""
+    global _local_slots
+    with _local_slots_lock:
+        if _local_slots is None:
+            _local_slots = threading.BoundedSemaphore(PASSWORD_HASH_SLOTS)
+        return _local_slots
+
+
+def _take_slot():
+    """Takes a hashing slot and returns the callable that frees it, or None if all are busy.
+
+    A host slot is an flock on one of the PASSWORD_HASH_SLOTS slot files;
+    the kernel drops it when the file is closed or its process dies, so a
+    killed worker never leaks one.
+    """
+    if fcntl is None:
+        slots = _process_slots()
+        return slots.release if slots.acquire(blocking=False) else None
+    os.makedirs(PASSWORD_HASH_SLOT_DIR, exist_ok=True)
+    for slot in range(PASSWORD_HASH_SLOTS):
+        fd = os.open(os.path.join(PASSWORD_HASH_SLOT_DIR, f'slot-{slot}'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return lambda: os.close(fd)
+    return None
+
+
+def _run(fn, *args):
+    release = _take_slot()
+    if release is None:
+        raise HashingBusy("Too many sign-ins in progress, please retry")
+    try:
+        return fn(*args)
+    finally:
+        release()
+
+
+def hash_password(password):
+    """Returns the bcrypt hash of `password` as text, at the configured work factor."""
+    return _run(
+        lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+    )
+
+
+def check_password(password, stored_hash):
+    return _run(bcrypt.checkpw, password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+
+def needs_rehash(stored_hash):
+    """True when the hash was made with a different work factor than BCRYPT_ROUNDS."""
+    try:
+        return int(stored_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,66 @@
+"""pytest plugin enforcing per-endpoint query budgets.
+
+Load it with `-p pytest_query_budget` (or `pytest_plugins = ["pytest_query_budget"]`
+in a conftest) and mark tests that drive the app through its test client:
+
+    @pytest.mark.query_budget(3)                       # any endpoint
+    @pytest.mark.query_budget({"bills.create_new_bill": 8, "items.get_items": 2})
+
+A test fails if any single request it makes runs more statements than the
+budget for its endpoint; the failure lists the repeated fingerprints.
+"""
+from collections import Counter
+import pytest
+from flask import has_request_context, request as flask_request
+from db import add_query_listener
+from querylog import fingerprint, repeated_statements
+
+_active = []  # the running test's {request: (endpoint, Counter of fingerprints)}
+
+
+def _on_query(sql, params, duration, rows):
+    if not _active or not has_request_context():
+        return
+    current = flask_request._get_current_object()
+    endpoint, seen = _active[-1].setdefault(current, (flask_request.endpoint, Counter()))
+    seen[fingerprint(sql)] += 1
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "query_budget(limit): fail if one request runs more statements than limit "
+        "(an int, or a dict of endpoint -> int)",
+    )
+    add_query_listener(_on_query)
+
+
+def _budget_for(limit, endpoint):
+    if isinstance(limit, dict):
+        return limit.get(endpoint)
+    return limit
+
+
+@pytest.fixture(autouse=True)
+def _query_budget(request):
+    marker = request.node.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+    limit = marker.args[0] if marker.args else marker.kwargs['limit']
+    requests_seen = {}
+    _active.append(requests_seen)
+    try:
+        yield requests_seen
+    finally:
+        _active.pop()
+
+    over = []
+    for endpoint, seen in requests_seen.values():
+        budget = _budget_for(limit, endpoint)
+        total = sum(seen.values())
+        if budget is not None and total > budget:
+            repeats = "; ".join(f"{count}x {statement}" for statement, count in repeated_statements(seen, 1))
+            over.append(f"{endpoint}: {total} queries (budget {budget}){' - ' + repeats if repeats else ''}")
+    if over:
+        pytest.fail("Query budget exceeded:\n  " + "\n  ".join(over), pytrace=False)
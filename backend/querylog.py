@@ -0,0 +1,85 @@
+"""Opt-in query auditing: N+1 detection and a slow-statement log.
+
+Enable with QUERY_AUDIT=1 (development and canary only). Every statement
+is fingerprinted per request; a request that runs one fingerprint more
+than QUERY_REPEAT_THRESHOLD times is reported, as is any statement slower
+than SLOW_QUERY_MS, with its parameter shape and the calling endpoint.
+Parameter values are never logged.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from flask import g, has_request_context, request
+from db import add_query_listener
+
+QUERY_AUDIT = os.getenv('QUERY_AUDIT', '').lower() in ('1', 'true', 'yes')
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '5'))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalizes a statement so runs differing only in literals or list lengths compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _VALUE_LIST.sub('(?+)', sql)
+    return _WHITESPACE.sub(' ', sql).strip().rstrip(';').lower()
+
+
+def param_shape(params):
+    """Describes the parameters by type (and length for lists), never by value."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: param_shape(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        if isinstance(params, list) and len(params) > 3:
+            return f"list[{len(params)}]"
+        return [param_shape(value) for value in params]
+    return type(params).__name__
+
+
+def _on_query(sql, params, duration, rows):
+    if not has_request_context():
+        return
+    seen = g.get('query_fingerprints')
+    if seen is None:
+        seen = g.query_fingerprints = Counter()
+    statement = fingerprint(sql)
+    seen[statement] += 1
+    if duration * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query (%.0f ms, %s rows) in %s %s: %s params=%s",
+            duration * 1000, rows, request.method, request.endpoint, statement, param_shape(params)
+        )
+
+
+def repeated_statements(seen, threshold=None):
+    """[(fingerprint, count)] for statements run more than `threshold` times, most repeated first."""
+    threshold = QUERY_REPEAT_THRESHOLD if threshold is None else threshold
+    return [(statement, count) for statement, count in seen.most_common() if count > threshold]
+
+
+def init_app(app):
+    """Registers the audit hooks when QUERY_AUDIT is set; a no-op otherwise."""
+    if not QUERY_AUDIT:
+        return
+    add_query_listener(_on_query)
+
+    @app.after_request
+    def report_repeated_queries(response):
+        for statement, count in repeated_statements(g.get('query_fingerprints') or Counter()):
+            logger.warning(
+                "Possible N+1 in %s %s: %s runs of %s",
+                request.method, request.endpoint, count, statement
+            )
+        return response
@@ -0,0 +1,72 @@
+"""Per-customer outstanding balances.
+
+The bill write paths call record_bill_balance() inside their transaction,
+the same way they update the daily rollups.
+
+    python receivables.py reconcile [--fix]    compare balances with bills
+"""
+import sys
+import psycopg2
+from config import DATABASE_URL
+
+# Expected balance per customer, computed from scratch.
+EXPECTED_BALANCES = """
+    SELECT b.customer_id, b.shop_id, SUM(b.total_amount - COALESCE(b.amount_paid, 0)) AS outstanding
+    FROM bills b
+    WHERE b.customer_id IS NOT NULL
+    GROUP BY b.customer_id, b.shop_id
+"""
+
+
+def record_bill_balance(cur, bill_id, sign):
+    """Adds (sign=1) or removes (sign=-1) what one bill leaves unpaid from its customer's balance."""
+    cur.execute("""
+        INSERT INTO customer_balances (customer_id, shop_id, outstanding)
+        SELECT b.customer_id, b.shop_id, %(sign)s * (b.total_amount - COALESCE(b.amount_paid, 0))
+        FROM bills b
+        WHERE b.id = %(bill_id)s AND b.customer_id IS NOT NULL
+        ON CONFLICT (customer_id) DO UPDATE SET
+            outstanding = customer_balances.outstanding + EXCLUDED.outstanding,
+            updated_at = now();
+    """, {"sign": sign, "bill_id": bill_id})
+
+
+def find_mismatches(cur):
+    """Returns [(customer_id, stored, expected), ...] where the ledger disagrees with bills."""
+    cur.execute(f"""
+        SELECT COALESCE(e.customer_id, cb.customer_id),
+               COALESCE(cb.outstanding, 0), COALESCE(e.outstanding, 0)
+        FROM ({EXPECTED_BALANCES}) e
+        FULL OUTER JOIN customer_balances cb ON cb.customer_id = e.customer_id
+        WHERE COALESCE(cb.outstanding, 0) <> COALESCE(e.outstanding, 0);
+    """)
+    return cur.fetchall()
+
+
+def rebuild(cur):
+    # Blocks concurrent bill writes from applying deltas mid-rebuild.
+    cur.execute("LOCK TABLE customer_balances IN SHARE ROW EXCLUSIVE MODE;")
+    cur.execute("DELETE FROM customer_balances;")
+    cur.execute(f"""
+        INSERT INTO customer_balances (customer_id, shop_id, outstanding)
+        {EXPECTED_BALANCES};
+    """)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'reconcile':
+        sys.exit("Usage: python receivables.py reconcile [--fix]")
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        cur = conn.cursor()
+        mismatches = find_mismatches(cur)
+        for customer_id, stored, expected in mismatches:
+            print(f"{customer_id}: ledger {stored}, bills {expected}")
+        print(f"{len(mismatches)} mismatched balances")
+        if mismatches and '--fix' in sys.argv:
+            rebuild(cur)
+            conn.commit()
+            print("Balances rebuilt from bills")
+        sys.exit(1 if mismatches and '--fix' not in sys.argv else 0)
+    finally:
+        conn.close()
@@ -0,0 +1,154 @@
+"""Sales reports over a date range, aggregated in SQL.
+
+Results are cached per shop, report and window, keyed on the shop's sales
+and catalog versions: every bill write bumps the first (see
+bump_sales_version) and item edits such as a new cost price bump the
+second, so a cached report is never served after the data behind it
+changed.
+"""
+import os
+from datetime import date, timedelta
+from flask import Blueprint, request, jsonify
+from cache import TTLCache
+from db import get_db_connection, fetch_dicts
+from decorators import token_required, shop_required, read_replica
+
+reports_bp = Blueprint('reports', __name__)
+
+TOP_SELLERS_DEFAULT = 10
+TOP_SELLERS_MAX = 100
+
+_reports = TTLCache(
+    maxsize=int(os.getenv('REPORT_CACHE_SIZE', '500')),
+    ttl=float(os.getenv('REPORT_CACHE_TTL', '600')),
+)
+
+# Per-item totals for the bills in the window. Cost uses the item's current
+# cost_price, since bill lines do not record what the stock cost at the time.
+ITEM_SALES = """
+    SELECT bi.item_id AS id, i.name, i.si_unit,
+           SUM(bi.quantity) AS quantity,
+           SUM(bi.quantity * bi.price_per_unit) AS revenue,
+           COUNT(DISTINCT bi.bill_id) AS bill_count,
+           SUM(bi.quantity * i.cost_price) AS cost,
+           SUM(bi.quantity * (bi.price_per_unit - i.cost_price)) AS gross_margin
+    FROM bills b
+    JOIN bill_items bi ON bi.bill_id = b.id
+    JOIN items i ON i.id = bi.item_id
+    WHERE b.shop_id = %(shop_id)s AND b.bill_date >= %(start)s AND b.bill_date < %(end)s
+    GROUP BY bi.item_id, i.name, i.si_unit
+"""
+
+CUSTOMER_REVENUE = """
+    SELECT b.customer_id AS id, COALESCE(MIN(c.name), 'Walk-in') AS name,
+           SUM(b.total_amount) AS revenue,
+           SUM(COALESCE(b.amount_paid, 0)) AS amount_paid,
+           COUNT(*) AS bill_count
+    FROM bills b
+    LEFT JOIN customers c ON c.id = b.customer_id
+    WHERE b.shop_id = %(shop_id)s AND b.bill_date >= %(start)s AND b.bill_date < %(end)s
+    GROUP BY b.customer_id
+    ORDER BY revenue DESC, b.customer_id
+"""
+
+
+def bump_sales_version(cur, bill_id):
+    """Marks the bill's shop's sales as changed; commits with the caller's transaction."""
+    cur.execute("""
+        INSERT INTO sales_versions (shop_id, version)
+        SELECT shop_id, 1 FROM bills WHERE id = %s
+        ON CONFLICT (shop_id) DO UPDATE SET version = sales_versions.version + 1;
+    """, (bill_id,))
+
+
+def _versions(cur, shop_id):
+    cur.execute("""
+        SELECT COALESCE((SELECT version FROM sales_versions WHERE shop_id = %(shop_id)s), 0),
+               COALESCE((SELECT version FROM catalog_versions WHERE shop_id = %(shop_id)s), 0);
+    """, {"shop_id": shop_id})
+    return cur.fetchone()
+
+
+def report_window(args):
+    """Parses from/to (YYYY-MM-DD, inclusive), defaulting to the current month."""
+    today = date.today()
+    start = date.fromisoformat(args['from']) if args.get('from') else today.replace(day=1)
+    end = date.fromisoformat(args['to']) if args.get('to') else today
+    if start > end:
+        raise ValueError("from must not be after to")
+    return start, end
+
+
+def item_sales(cur, shop_id, start, end, order_by='revenue', limit=None):
+    """Per-item quantity, revenue, cost and gross margin for start..end inclusive."""
+    cur.execute(
+        f"{ITEM_SALES} ORDER BY {order_by} DESC NULLS LAST, bi.item_id" + (" LIMIT %(limit)s" if limit else ""),
+        {"shop_id": shop_id, "start": start, "end": end + timedelta(days=1), "limit": limit},
+    )
+    return fetch_dicts(cur)
+
+
+def customer_revenue(cur, shop_id, start, end):
+    cur.execute(CUSTOMER_REVENUE, {"shop_id": shop_id, "start": start, "end": end + timedelta(days=1)})
+    return fetch_dicts(cur)
+
+
+def _with_margin_pct(rows):
+    for row in rows:
+        revenue, margin = row['revenue'], row['gross_margin']
+        row['margin_pct'] = round(float(margin / revenue * 100), 2) if revenue and margin is not None else None
+    return rows
+
+
+REPORTS = {
+    'sales-by-item': lambda cur, shop_id, start, end, args: item_sales(cur, shop_id, start, end),
+    'top-sellers': lambda cur, shop_id, start, end, args: item_sales(
+        cur, shop_id, start, end, order_by=args['by'], limit=args['limit']
+    ),
+    'margins': lambda cur, shop_id, start, end, args: _with_margin_pct(
+        item_sales(cur, shop_id, start, end, order_by='gross_margin')
+    ),
+    'customers': lambda cur, shop_id, start, end, args: customer_revenue(cur, shop_id, start, end),
+}
+
+
+def report_args(name, args):
+    if name != 'top-sellers':
+        return {}
+    limit = int(args.get('limit', TOP_SELLERS_DEFAULT))
+    if not 1 <= limit <= TOP_SELLERS_MAX:
+        raise ValueError(f"limit must be between 1 and {TOP_SELLERS_MAX}")
+    by = args.get('by', 'revenue')
+    if by not in ('revenue', 'quantity'):
+        raise ValueError("by must be revenue or quantity")
+    return {"limit": limit, "by": by}
+
+
+@reports_bp.route('/api/reports/<string:name>', methods=['GET'])
+@token_required
+@shop_required
+@read_replica
+def get_report(current_user_id, shop, name):
+    """One report for from..to; see REPORTS for the available names."""
+    if name not in REPORTS:
+        return jsonify({"error": f"Unknown report '{name}'. Choose one of: {', '.join(REPORTS)}"}), 404
+    try:
+        start, end = report_window(request.args)
+        options = report_args(name, request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        key = (shop.id, name, start, end, tuple(sorted(options.items())), *_versions(cur, shop.id))
+        rows = _reports.get(key)
+        if rows is None:
+            rows = REPORTS[name](cur, shop.id, start, end, options)
+            _reports.set(key, rows)
+        return jsonify({"from": start.isoformat(), "to": end.isoformat(), "rows": rows}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
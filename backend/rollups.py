@@ -0,0 +1,139 @@
+"""Daily per-shop and per-item sales rollups.
+
+The bill write paths call record_bill() inside their transaction: +1 once
+a bill and its lines are written, -1 before a bill is changed or deleted.
+
+    python rollups.py backfill [shop_id]    rebuild from the bills table
+"""
+import sys
+import psycopg2
+from config import DATABASE_URL
+
+SALES_TOTALS = ("revenue", "amount_paid", "bill_count", "items_sold")
+
+
+# First key of the pg_advisory_xact_lock(int, int) pairs taken on shops' sales.
+SHOP_SALES_LOCK = 42011
+
+
+def lock_shop_sales(cur, shop_id):
+    """Serializes the shop's bill writes and rollup rebuilds until the transaction ends."""
+    cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s));", (SHOP_SALES_LOCK, str(shop_id)))
+
+
+def record_bill(cur, bill_id, sign, items=True):
+    """Adds (sign=1) or removes (sign=-1) one bill's totals from its day's rollups.
+
+    items=False leaves item_daily_sales alone, for edits that keep the bill's
+    lines and date.
+    """
+    # Bill writers already hold this lock; taking it here keeps any other
+    # caller from applying deltas while backfill() rebuilds the shop.
+    cur.execute(
+        "SELECT pg_advisory_xact_lock(%s, hashtext(shop_id::text)) FROM bills WHERE id = %s;",
+        (SHOP_SALES_LOCK, bill_id)
+    )
+    cur.execute("""
+        INSERT INTO daily_sales (shop_id, day, revenue, amount_paid, bill_count, items_sold)
+        SELECT b.shop_id, b.bill_date::date,
+               %(sign)s * b.total_amount,
+               %(sign)s * COALESCE(b.amount_paid, 0),
+               %(sign)s,
+               %(sign)s * COALESCE((SELECT SUM(bi.quantity) FROM bill_items bi WHERE bi.bill_id = b.id), 0)
+        FROM bills b
+        WHERE b.id = %(bill_id)s
+        ON CONFLICT (shop_id, day) DO UPDATE SET
+            revenue = daily_sales.revenue + EXCLUDED.revenue,
+            amount_paid = daily_sales.amount_paid + EXCLUDED.amount_paid,
+            bill_count = daily_sales.bill_count + EXCLUDED.bill_count,
+            items_sold = daily_sales.items_sold + EXCLUDED.items_sold;
+    """, {"sign": sign, "bill_id": bill_id})
+    if not items:
+        return
+    # Rows are upserted in item id order, the order stock.reserve_stock locks items in.
+    cur.execute("""
+        INSERT INTO item_daily_sales (shop_id, day, item_id, quantity)
+        SELECT b.shop_id, b.bill_date::date, bi.item_id, %(sign)s * SUM(bi.quantity)
+        FROM bills b
+        JOIN bill_items bi ON bi.bill_id = b.id
+        WHERE b.id = %(bill_id)s
+        GROUP BY b.shop_id, b.bill_date::date, bi.item_id
+        ORDER BY bi.item_id
+        ON CONFLICT (shop_id, day, item_id) DO UPDATE SET
+            quantity = item_daily_sales.quantity + EXCLUDED.quantity;
+    """, {"sign": sign, "bill_id": bill_id})
+
+
+def sales_summary(cur, shop_id, start, end):
+    """Returns (totals, days) for start..end inclusive, reading one rollup row per day."""
+    cur.execute("""
+        SELECT day, revenue, amount_paid, bill_count, items_sold
+        FROM daily_sales
+        WHERE shop_id = %s AND day BETWEEN %s AND %s AND bill_count <> 0
+        ORDER BY day;
+    """, (shop_id, start, end))
+    days = []
+    totals = dict.fromkeys(SALES_TOTALS, 0)
+    for row in cur.fetchall():
+        day = dict(zip(("day",) + SALES_TOTALS, row))
+        for key in SALES_TOTALS:
+            totals[key] += day[key]
+        days.append(day)
+    return totals, days
+
+
+def backfill(cur, shop_id=None, progress=None):
+    """Recomputes the rollups of one shop (or all shops) from bills and bill_items.
+
+    Returns the number of daily_sales rows written. progress, if given, is
+    called as progress(fraction, message) as each stage starts.
+    """
+    progress = progress or (lambda fraction, message: None)
+    # Blocks concurrent bill writes from applying deltas mid-rebuild: only the
+    # shop's own writers for a one-shop rebuild, every shop's otherwise.
+    if shop_id:
+        lock_shop_sales(cur, shop_id)
+    else:
+        cur.execute("LOCK TABLE daily_sales, item_daily_sales IN SHARE ROW EXCLUSIVE MODE;")
+    shop_filter = "WHERE b.shop_id = %(shop_id)s" if shop_id else ""
+    for table in ("daily_sales", "item_daily_sales"):
+        cur.execute(
+            f"DELETE FROM {table}" + (" WHERE shop_id = %(shop_id)s" if shop_id else "") + ";",
+            {"shop_id": shop_id}
+        )
+    progress(0.2, "Rebuilding item rollups")
+    cur.execute(f"""
+        INSERT INTO item_daily_sales (shop_id, day, item_id, quantity)
+        SELECT b.shop_id, b.bill_date::date, bi.item_id, SUM(bi.quantity)
+        FROM bills b
+        JOIN bill_items bi ON bi.bill_id = b.id
+        {shop_filter}
+        GROUP BY b.shop_id, b.bill_date::date, bi.item_id;
+    """, {"shop_id": shop_id})
+    progress(0.6, "Rebuilding daily rollups")
+    cur.execute(f"""
+        INSERT INTO daily_sales (shop_id, day, revenue, amount_paid, bill_count, items_sold)
+        SELECT b.shop_id, b.bill_date::date,
+               SUM(b.total_amount), SUM(COALESCE(b.amount_paid, 0)), COUNT(*),
+               COALESCE(SUM(q.quantity), 0)
+        FROM bills b
+        LEFT JOIN (
+            SELECT bill_id, SUM(quantity) AS quantity FROM bill_items GROUP BY bill_id
+        ) q ON q.bill_id = b.id
+        {shop_filter}
+        GROUP BY b.shop_id, b.bill_date::date;
+    """, {"shop_id": shop_id})
+    return cur.rowcount
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        sys.exit("Usage: python rollups.py backfill [shop_id]")
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        cur = conn.cursor()
+        rows = backfill(cur, sys.argv[2] if len(sys.argv) > 2 else None)
+        conn.commit()
+        print(f"Rebuilt {rows} daily rollup rows")
+    finally:
+        conn.close()
@@ -0,0 +1,158 @@
+import heapq
+import os
+import threading
+from bisect import bisect_right
+from cache import TTLCache
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# Rank buckets, best first.
+NAME_PREFIX, NAME_WORD_PREFIX, NAME_SUBSTRING, DESCRIPTION_PREFIX, DESCRIPTION_SUBSTRING = range(5)
+
+
+class _Haystack:
+    """One field of every entry joined into a single string, so candidate
+    entries are found with str.find instead of a Python-level scan."""
+
+    def __init__(self, values):
+        self.text = "\n".join(value.replace("\n", " ") for value in values)
+        self.starts = []
+        offset = 0
+        for value in values:
+            self.starts.append(offset)
+            offset += len(value) + 1
+
+    def matching(self, q):
+        """Yields, in order, the positions of the entries whose value may contain q."""
+        pos = self.text.find(q)
+        while pos != -1:
+            position = bisect_right(self.starts, pos) - 1
+            yield position
+            if position + 1 == len(self.starts):
+                return
+            pos = self.text.find(q, self.starts[position + 1])
+
+
+class ItemSearchIndex:
+    """In-memory name/description matcher over one shop's active items.
+
+    Holds only what matching needs and is tagged with the shop's search
+    version, which item creates, edits, deletes and restores bump but stock
+    changes do not; search_catalog reads prices and stock for the matches.
+    """
+
+    def __init__(self, version, items):
+        self.version = version
+        self.lock = threading.Lock()
+        self._entries = {}
+        self._haystacks = None
+        for item in items:
+            self.upsert(item)
+
+    def upsert(self, item):
+        name = (item.get('name') or '').lower()
+        description = (item.get('description') or '').lower()
+        self._entries[str(item['id'])] = (name, name.split(), description)
+        self._haystacks = None
+
+    def remove(self, item_id):
+        if self._entries.pop(str(item_id), None) is not None:
+            self._haystacks = None
+
+    def _rank(self, q, name, words, description):
+        if name.startswith(q):
+            return NAME_PREFIX
+        if any(word.startswith(q) for word in words):
+            return NAME_WORD_PREFIX
+        if q in name:
+            return NAME_SUBSTRING
+        if description.startswith(q):
+            return DESCRIPTION_PREFIX
+        if q in description:
+            return DESCRIPTION_SUBSTRING
+        return None
+
+    def search(self, query, limit):
+        """Ids of the best `limit` matches, best first."""
+        q = query.strip().lower()
+        if not q:
+            return []
+        if self._haystacks is None:
+            # Entries are laid out in result order within a rank: shortest name first
+            ids = sorted(self._entries, key=lambda item_id: (
+                len(self._entries[item_id][0]), self._entries[item_id][0], item_id
+            ))
+            entries = [self._entries[item_id] for item_id in ids]
+            self._haystacks = (
+                ids,
+                _Haystack([entry[0] for entry in entries]),
+                _Haystack([entry[2] for entry in entries]),
+            )
+        ids, names, descriptions = self._haystacks
+        ranked = [[] for _ in range(DESCRIPTION_SUBSTRING + 1)]
+        previous = None
+        for position in heapq.merge(names.matching(q), descriptions.matching(q)):
+            if position == previous:
+                continue
+            previous = position
+            item_id = ids[position]
+            rank = self._rank(q, *self._entries[item_id])
+            if rank is not None:
+                ranked[rank].append(item_id)
+                # No later entry can outrank a full set of name-prefix matches
+                if len(ranked[NAME_PREFIX]) >= limit:
+                    break
+        return [item_id for bucket in ranked for item_id in bucket][:limit]
+
+
+_indexes = TTLCache(
+    maxsize=int(os.getenv('SEARCH_INDEX_SHOPS', '200')),
+    ttl=float(os.getenv('SEARCH_INDEX_TTL', '3600')),
+)
+_indexes_lock = threading.Lock()
+
+
+def get_index(shop_id, version, load_items):
+    """Returns the shop's index at `version`, rebuilding it via load_items() if stale."""
+    index = _indexes.get(shop_id)
+    if index is not None and index.version == version:
+        return index
+    index = ItemSearchIndex(version, load_items())
+    _indexes.set(shop_id, index)
+    return index
+
+
+def _apply(shop_id, new_version, change):
+    """Applies a committed change if the cached index is exactly one version behind.
+
+    Otherwise another worker changed the catalog in between, and the index
+    is dropped so the next search rebuilds it.
+    """
+    with _indexes_lock:
+        index = _indexes.get(shop_id)
+        if index is None:
+            return
+        if index.version != new_version - 1:
+            _indexes.pop(shop_id)
+            return
+        with index.lock:
+            change(index)
+            index.version = new_version
+
+
+def index_upsert(shop_id, new_version, item):
+    _apply(shop_id, new_version, lambda index: index.upsert(item))
+
+
+def index_remove(shop_id, new_version, item_id):
+    _apply(shop_id, new_version, lambda index: index.remove(item_id))
+
+
+def index_invalidate(shop_id):
+    _indexes.pop(shop_id)
+
+
+def search_items(index, query, limit):
+    with index.lock:
+        return index.search(query, limit)
@@ -0,0 +1,72 @@
+from decimal import Decimal
+from datetime import date, datetime
+from uuid import UUID
+import orjson
+from flask import request
+from flask.json.provider import JSONProvider
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are only offered when it is installed
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _orjson_default(obj):
+    # orjson handles datetime and UUID itself; numeric columns arrive as Decimal.
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, memoryview):
+        return obj.tobytes().decode()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_json(obj):
+    """Serializes like the API's JSON responses, for output written outside them (exports)."""
+    return orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS).decode()
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not MessagePack serializable")
+
+
+def wants_msgpack():
+    if msgpack is None or not request:
+        return False
+    best = request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson that also answers Accept: application/msgpack."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return to_json(obj)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_msgpack():
+            response = self._app.response_class(
+                msgpack.packb(obj, default=_msgpack_default, use_bin_type=True),
+                mimetype=MSGPACK_MIMETYPE,
+            )
+        else:
+            response = self._app.response_class(
+                orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS),
+                mimetype=self.mimetype,
+            )
+        response.vary.add('Accept')
+        return response
@@ -1,15 +1,12 @@
 import jwt
-import psycopg2
 from functools import wraps
 from flask import Blueprint, request, jsonify
-from config import DATABASE_URL, SECRET_KEY
+from config import SECRET_KEY
+from db import get_db_connection
+from functions import invalidate_shop
 
 shop_bp = Blueprint('shop', __name__)
 
-def get_db_connection():
-    conn = psycopg2.connect(DATABASE_URL)
-    return conn
-
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -51,6 +48,7 @@ def create_shop(current_user_id):
         )
         new_shop_id = cur.fetchone()[0]
         conn.commit()
+        invalidate_shop(current_user_id)
         return jsonify({"message": "Shop created successfully", "shop_id": new_shop_id}), 201
 
     except Exception as e:
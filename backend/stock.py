@@ -0,0 +1,121 @@
+import os
+from db import fetch_dicts
+from bill_lines import to_decimal
+
+# Defaults for the reorder suggestions; each can be overridden per request.
+REORDER_WINDOW_DAYS = int(os.getenv('REORDER_WINDOW_DAYS', '28'))
+REORDER_COVER_DAYS = float(os.getenv('REORDER_COVER_DAYS', '7'))
+REORDER_TARGET_DAYS = float(os.getenv('REORDER_TARGET_DAYS', '30'))
+
+
+def apply_stock_deltas(cur, shop_id, deltas, allow_negative=False):
+    """Adds signed deltas ({item_id: delta}) to the shop's active items.
+
+    Returns ({item_id: new quantity}, failures). If any item is missing or
+    (unless allow_negative) a decrease would take it below zero, nothing should be kept:
+    the caller rolls back and reports `failures`, a list of
+    {"id", "error"[, "stock_quantity"]} dicts.
+    """
+    item_ids = [str(item_id) for item_id in deltas]
+    # Lock in id order first, as reserve_stock does, so the two never deadlock.
+    cur.execute("""
+        SELECT id FROM items
+        WHERE id = ANY(%s::uuid[]) AND shop_id = %s
+        ORDER BY id
+        FOR NO KEY UPDATE;
+    """, (item_ids, shop_id))
+    cur.execute("""
+        UPDATE items SET stock_quantity = items.stock_quantity + v.delta
+        FROM unnest(%s::uuid[], %s::numeric[]) AS v(item_id, delta)
+        WHERE items.id = v.item_id AND items.shop_id = %s AND items.is_delete = 0
+          AND (%s OR v.delta >= 0 OR items.stock_quantity + v.delta >= 0)
+        RETURNING items.id, items.stock_quantity;
+    """, (item_ids, list(deltas.values()), shop_id, allow_negative))
+    updated = {str(item_id): quantity for item_id, quantity in cur.fetchall()}
+    if len(updated) == len(item_ids):
+        return updated, []
+
+    missing = [item_id for item_id in item_ids if item_id not in updated]
+    cur.execute("""
+        SELECT id, stock_quantity FROM items
+        WHERE id = ANY(%s::uuid[]) AND shop_id = %s AND is_delete = 0;
+    """, (missing, shop_id))
+    current = {str(item_id): quantity for item_id, quantity in cur.fetchall()}
+    failures = []
+    for item_id in missing:
+        if item_id in current:
+            failures.append({"id": item_id, "error": "Stock cannot be less than zero", "stock_quantity": current[item_id]})
+        else:
+            failures.append({"id": item_id, "error": "Item not found"})
+    return updated, failures
+
+
+def reserve_stock(cur, shop_id, deltas):
+    """Applies a bill's signed stock deltas ({item_id: delta}) without deadlocks or overselling.
+
+    Negative deltas take stock, positive ones return it. Every touched row
+    is locked in id order first, so concurrent bills over overlapping
+    items queue up instead of deadlocking; the decrement is then one
+    conditional statement. Returns a list of shortfalls
+    ({"id", "name", "requested", "available"}) covering every line that
+    cannot be met (or is not in this shop); when it is non-empty nothing
+    was changed and the caller should roll back.
+    """
+    deltas = {str(item_id): to_decimal(delta) for item_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+    cur.execute("""
+        SELECT id, name, stock_quantity FROM items
+        WHERE id = ANY(%s::uuid[]) AND shop_id = %s
+        ORDER BY id
+        FOR NO KEY UPDATE;
+    """, (list(deltas), shop_id))
+    locked = {str(item_id): (name, quantity) for item_id, name, quantity in cur.fetchall()}
+
+    shortfalls = []
+    for item_id, delta in deltas.items():
+        if item_id not in locked:
+            shortfalls.append({"id": item_id, "name": None, "requested": -delta, "available": None})
+            continue
+        name, available = locked[item_id]
+        if delta < 0 and available + delta < 0:
+            shortfalls.append({"id": item_id, "name": name, "requested": -delta, "available": available})
+    if shortfalls:
+        return shortfalls
+
+    cur.execute("""
+        UPDATE items SET stock_quantity = items.stock_quantity + v.delta
+        FROM unnest(%s::uuid[], %s::numeric[]) AS v(item_id, delta)
+        WHERE items.id = v.item_id
+          AND (v.delta >= 0 OR items.stock_quantity + v.delta >= 0);
+    """, (list(deltas), list(deltas.values())))
+    return []
+
+
+def reorder_suggestions(cur, shop_id, window_days, cover_days, target_days):
+    """Active items expected to run out within `cover_days`, most urgent first.
+
+    Velocity is the average units sold per day over the last `window_days`
+    (today included), read from the item_daily_sales rollup rather than
+    from bill history. `suggested_quantity` tops stock up to `target_days`
+    of cover at that velocity.
+    """
+    cur.execute("""
+        WITH velocity AS (
+            SELECT item_id, SUM(quantity) / %(window)s::numeric AS per_day
+            FROM item_daily_sales
+            WHERE shop_id = %(shop_id)s AND day > current_date - %(window)s
+            GROUP BY item_id
+            HAVING SUM(quantity) > 0
+        )
+        SELECT i.id, i.name, i.si_unit, i.stock_quantity,
+               ROUND(v.per_day, 3) AS daily_velocity,
+               ROUND(GREATEST(i.stock_quantity, 0) / v.per_day, 1) AS days_of_cover,
+               CEIL(v.per_day * %(target)s - i.stock_quantity) AS suggested_quantity
+        FROM velocity v
+        JOIN items i ON i.id = v.item_id
+        WHERE i.shop_id = %(shop_id)s AND i.is_delete = 0
+          AND GREATEST(i.stock_quantity, 0) / v.per_day < %(cover)s
+        ORDER BY GREATEST(i.stock_quantity, 0) / v.per_day, v.per_day DESC, i.id;
+    """, {"shop_id": shop_id, "window": window_days, "cover": cover_days, "target": target_days})
+    return fetch_dicts(cur)
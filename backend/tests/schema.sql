@@ -0,0 +1,64 @@
+-- The base tables the app was built on, as the code uses them. The test
+-- database is created from this file, then migrations/ is applied on top.
+CREATE TABLE users (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    phone_number TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL
+);
+
+CREATE TABLE shop (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES users (id),
+    name TEXT NOT NULL,
+    gstin TEXT,
+    address TEXT
+);
+
+CREATE TABLE items (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    shop_id UUID NOT NULL REFERENCES shop (id),
+    name TEXT NOT NULL,
+    description TEXT,
+    cost_price NUMERIC(12, 2),
+    wholesale_price NUMERIC(12, 2),
+    retail_price NUMERIC(12, 2) NOT NULL,
+    stock_quantity NUMERIC(12, 3) NOT NULL DEFAULT 0,
+    si_unit TEXT,
+    is_delete INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE customers (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    shop_id UUID NOT NULL REFERENCES shop (id),
+    name TEXT,
+    phone_number TEXT,
+    email TEXT,
+    address TEXT,
+    is_delete INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE bills (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    shop_id UUID NOT NULL REFERENCES shop (id),
+    customer_id UUID REFERENCES customers (id),
+    total_amount NUMERIC(12, 2) NOT NULL,
+    amount_paid NUMERIC(12, 2),
+    status TEXT,
+    bill_date TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE bill_items (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    bill_id UUID NOT NULL REFERENCES bills (id),
+    item_id UUID NOT NULL REFERENCES items (id),
+    quantity NUMERIC(12, 3) NOT NULL,
+    price_per_unit NUMERIC(12, 2) NOT NULL
+);
+
+CREATE TABLE customer_item_prices (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    customer_id UUID NOT NULL REFERENCES customers (id),
+    item_id UUID NOT NULL REFERENCES items (id),
+    custom_price NUMERIC(12, 2) NOT NULL,
+    UNIQUE (customer_id, item_id)
+);
@@ -0,0 +1,129 @@
+"""Stress test: concurrent bill writes on one shop must not deadlock or
+oversell, and stock, rollups and balances must add up afterwards."""
+import random
+import threading
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from receivables import find_mismatches
+
+WRITERS = 8
+ROUNDS = 30
+# Well below what the writers try to sell, so the oversell guard is hit
+INITIAL_STOCK = 30
+PHONES = ("9000000001", "9000000002", "9000000003")
+
+
+def _bill(rng, item_ids):
+    lines = [
+        {"item": {"id": item_id}, "quantity": rng.choice([1, 2, 1.5, 3]), "price": 10}
+        for item_id in rng.sample(item_ids, rng.randint(1, len(item_ids)))
+    ]
+    total = sum(line["quantity"] * line["price"] for line in lines)
+    phone = rng.choice(PHONES + (None,))
+    return {
+        "billItems": lines,
+        "totalAmount": total,
+        "status": rng.choice(["paid", "unpaid"]),
+        "amountPaid": 0,
+        "customerPhone": phone,
+        "customerName": f"Customer {phone}" if phone else None,
+    }
+
+
+def test_concurrent_creates_edits_and_deletes(app, owner, db_conn, database):
+    item_ids = owner.add_items(6, stock=INITIAL_STOCK)
+    bill_ids = []
+    bills_lock = threading.Lock()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        failures, conflicts = [], 0
+        for _ in range(ROUNDS):
+            with bills_lock:
+                target = rng.choice(bill_ids) if bill_ids else None
+            action = rng.choice(["create", "create", "edit", "edit", "status", "delete"]) if target else "create"
+            if action == "create":
+                response = client.post('/api/create-bill', json=_bill(rng, item_ids), headers=owner.headers)
+                if response.status_code == 201:
+                    with bills_lock:
+                        bill_ids.append(response.get_json()["bill_id"])
+            elif action == "edit":
+                response = client.put(f'/api/bills/{target}', json=_bill(rng, item_ids), headers=owner.headers)
+            elif action == "status":
+                response = client.put(
+                    f'/api/bills/{target}', json={"status": "paid", "totalAmount": 10, "amountPaid": 10},
+                    headers=owner.headers
+                )
+            else:
+                with bills_lock:
+                    if target not in bill_ids:
+                        continue
+                    bill_ids.remove(target)
+                response = client.delete(f'/api/bills/{target}?restore_items=true', headers=owner.headers)
+            # 404 is a lost race with a delete; anything 5xx (deadlocks included) is a failure.
+            if response.status_code >= 500:
+                failures.append((action, response.status_code, response.get_json()))
+            conflicts += response.status_code == 409
+        return failures, conflicts
+
+    lowest_stock = []
+    writing = threading.Event()
+
+    def watch_stock():
+        conn = psycopg2.connect(database)
+        cur = conn.cursor()
+        while writing.is_set():
+            cur.execute("SELECT MIN(stock_quantity) FROM items WHERE shop_id = %s;", (owner.shop_id,))
+            lowest_stock.append(cur.fetchone()[0])
+            conn.rollback()
+        conn.close()
+
+    writing.set()
+    watcher = threading.Thread(target=watch_stock)
+    watcher.start()
+    try:
+        with ThreadPoolExecutor(WRITERS) as pool:
+            results = list(pool.map(writer, range(WRITERS)))
+    finally:
+        writing.clear()
+        watcher.join()
+    assert [f for failures, _ in results for f in failures] == []
+    assert sum(conflicts for _, conflicts in results) > 0
+    assert lowest_stock and min(lowest_stock) >= 0
+
+    cur = db_conn.cursor()
+    cur.execute("""
+        SELECT i.id, i.stock_quantity, COALESCE(SUM(bi.quantity), 0)
+        FROM items i LEFT JOIN bill_items bi ON bi.item_id = i.id
+        WHERE i.shop_id = %s GROUP BY i.id, i.stock_quantity;
+    """, (owner.shop_id,))
+    for item_id, stock, sold in cur.fetchall():
+        assert stock >= 0, item_id
+        assert stock + sold == INITIAL_STOCK, item_id
+
+    cur.execute("""
+        SELECT COALESCE(SUM(revenue), 0), COALESCE(SUM(bill_count), 0), COALESCE(SUM(items_sold), 0)
+        FROM daily_sales WHERE shop_id = %s;
+    """, (owner.shop_id,))
+    rollup = cur.fetchone()
+    cur.execute("""
+        SELECT COALESCE(SUM(total_amount), 0), COUNT(*),
+               COALESCE((SELECT SUM(bi.quantity) FROM bill_items bi JOIN bills b ON b.id = bi.bill_id
+                         WHERE b.shop_id = %(shop)s), 0)
+        FROM bills WHERE shop_id = %(shop)s;
+    """, {"shop": owner.shop_id})
+    assert rollup == cur.fetchone()
+
+    cur.execute("""
+        SELECT d.item_id, d.quantity, COALESCE(SUM(bi.quantity), 0)
+        FROM (SELECT item_id, SUM(quantity) AS quantity FROM item_daily_sales
+              WHERE shop_id = %s GROUP BY item_id) d
+        LEFT JOIN bill_items bi ON bi.item_id = d.item_id
+        GROUP BY d.item_id, d.quantity;
+    """, (owner.shop_id,))
+    for item_id, rolled_up, sold in cur.fetchall():
+        assert rolled_up == sold, item_id
+
+    assert find_mismatches(cur) == []
+    cur.close()
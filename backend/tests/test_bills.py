@@ -0,0 +1,108 @@
+def _create_bill(client, owner, item_id, customer_name=None):
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 1, "price": 10}],
+        "totalAmount": 10, "status": "paid", "amountPaid": 10,
+        "customerName": customer_name,
+    }, headers=owner.headers)
+    assert response.status_code == 201
+    return response.get_json()["bill_id"]
+
+
+def _search(client, owner, q, **params):
+    response = client.get('/api/bills', query_string={"q": q, **params}, headers=owner.headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_covers_bills_beyond_the_first_page(client, owner):
+    item_id, = owner.add_items(1)
+    wanted = _create_bill(client, owner, item_id, customer_name="Ravi Traders")
+    for _ in range(3):
+        _create_bill(client, owner, item_id, customer_name="Meena Stores")
+
+    page = _search(client, owner, "ravi", limit=1, include_total="true")
+    assert [bill["id"] for bill in page["bills"]] == [wanted]
+    assert page["total"] == 1
+    assert page["next_cursor"] is None
+
+
+def test_search_matches_bill_ids_and_walk_in_bills(client, owner):
+    item_id, = owner.add_items(1)
+    walk_in = _create_bill(client, owner, item_id)
+    named = _create_bill(client, owner, item_id, customer_name="Ravi Traders")
+
+    assert [bill["id"] for bill in _search(client, owner, "walk")["bills"]] == [walk_in]
+    assert [bill["id"] for bill in _search(client, owner, named[:8].upper())["bills"]] == [named]
+
+
+def test_search_treats_like_wildcards_literally(client, owner):
+    item_id, = owner.add_items(1)
+    _create_bill(client, owner, item_id, customer_name="Ravi Traders")
+    discounted = _create_bill(client, owner, item_id, customer_name="50% Off Mart")
+
+    assert _search(client, owner, "%")["bills"][0]["id"] == discounted
+    assert len(_search(client, owner, "%")["bills"]) == 1
+    assert _search(client, owner, "_")["bills"] == []
+
+
+def test_editing_a_paid_bill_without_amount_paid_leaves_nothing_owed(client, owner, db_conn):
+    item_id, = owner.add_items(1)
+    bill_id = _create_bill(client, owner, item_id, customer_name="Ravi Traders")
+
+    # The edit modal only sends amountPaid for partial bills
+    response = client.put(f'/api/bills/{bill_id}', json={
+        "customerName": "Ravi Traders", "customerPhone": "",
+        "billItems": [{"item": {"id": item_id}, "quantity": 2, "price": 10}],
+        "totalAmount": 20, "status": "paid",
+    }, headers=owner.headers)
+    assert response.status_code == 200
+
+    cur = db_conn.cursor()
+    cur.execute("SELECT amount_paid FROM bills WHERE id = %s;", (bill_id,))
+    assert cur.fetchone()[0] == 20
+    cur.execute("SELECT SUM(outstanding) FROM customer_balances WHERE shop_id = %s;", (owner.shop_id,))
+    assert cur.fetchone()[0] == 0
+    cur.execute("SELECT amount_paid FROM daily_sales WHERE shop_id = %s;", (owner.shop_id,))
+    assert cur.fetchone()[0] == 20
+
+
+def test_status_only_edit_keeps_the_rest_of_the_header(client, owner, db_conn):
+    item_id, = owner.add_items(1)
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 2, "price": 10}],
+        "totalAmount": 20, "status": "unpaid", "customerName": "Ravi Traders",
+    }, headers=owner.headers)
+    bill_id = response.get_json()["bill_id"]
+    cur = db_conn.cursor()
+    cur.execute("SELECT customer_id FROM bills WHERE id = %s;", (bill_id,))
+    customer_id = cur.fetchone()[0]
+
+    response = client.put(f'/api/bills/{bill_id}', json={"status": "paid"}, headers=owner.headers)
+    assert response.status_code == 200
+
+    cur.execute("SELECT customer_id, total_amount, status, amount_paid FROM bills WHERE id = %s;", (bill_id,))
+    assert cur.fetchone() == (customer_id, 20, "paid", 20)
+    cur.execute("SELECT outstanding FROM customer_balances WHERE customer_id = %s;", (customer_id,))
+    assert cur.fetchone()[0] == 0
+
+
+def test_price_overrides_keep_the_customer_when_their_items_are_deleted(client, owner, db_conn):
+    item_id, = owner.add_items(1)
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 1, "price": 8}],
+        "totalAmount": 8, "status": "paid", "customerName": "Ravi Traders", "customerPhone": "9000000042",
+    }, headers=owner.headers)
+    assert response.status_code == 201
+    cur = db_conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM customer_item_prices WHERE item_id = %s;", (item_id,))
+    assert cur.fetchone()[0] == 1
+    cur.execute("UPDATE items SET is_delete = 1 WHERE id = %s;", (item_id,))
+
+    response = client.get(
+        '/api/customer-prices', query_string={"phone_number": "9000000042", "mode": "overrides"},
+        headers=owner.headers,
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["customer_id"] is not None
+    assert body["overrides"] == []
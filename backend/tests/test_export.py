@@ -0,0 +1,18 @@
+import json
+
+
+def test_ndjson_export_writes_values_as_the_api_does(client, owner):
+    item_id, = owner.add_items(1, price=10.5)
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 1.5, "price": 10.5}],
+        "totalAmount": 15.75, "status": "paid",
+    }, headers=owner.headers)
+    bill_id = response.get_json()["bill_id"]
+
+    exported = client.get('/api/export/bills?format=ndjson', headers=owner.headers).get_data(as_text=True)
+    line, = [json.loads(text) for text in exported.splitlines()]
+    api_bill = client.get(f'/api/bills?ids={bill_id}', headers=owner.headers).get_json()["bills"][0]
+
+    assert line["total_amount"] == api_bill["totalAmount"] == 15.75
+    assert line["quantity"] == 1.5
+    assert line["bill_date"] == api_bill["createdAt"]
@@ -0,0 +1,32 @@
+import io
+
+CATALOG = """name,cost_price,retail_price,stock_quantity
+Rice,40,50,10
+Too dear,1,99999999999,1
+Rounds up too far,1,9999999999.999,1
+Too much stock,1,10,1000000000
+Refund,1,-5,1
+Shrinkage,1,10,-3
+Sugar,30,35,2.5
+"""
+
+
+def test_import_rejects_out_of_range_rows_and_keeps_the_rest(client, owner, db_conn):
+    response = client.post(
+        '/api/items/import?format=csv', headers=owner.headers,
+        data={"file": (io.BytesIO(CATALOG.encode('utf-8')), 'items.csv')},
+    )
+    assert response.status_code == 200, response.get_json()
+    summary = response.get_json()
+    assert summary["inserted"] == 2
+    assert summary["errors"] == [
+        {"line": 3, "error": "retail_price must be less than 10000000000"},
+        {"line": 4, "error": "retail_price must be less than 10000000000"},
+        {"line": 5, "error": "stock_quantity must be less than 1000000000"},
+        {"line": 6, "error": "retail_price cannot be negative"},
+        {"line": 7, "error": "stock_quantity cannot be negative"},
+    ]
+
+    cur = db_conn.cursor()
+    cur.execute("SELECT name, retail_price, stock_quantity FROM items WHERE shop_id = %s ORDER BY name;", (owner.shop_id,))
+    assert cur.fetchall() == [("Rice", 50, 10), ("Sugar", 35, 2.5)]
@@ -0,0 +1,89 @@
+import io
+import time
+import psycopg2
+import pytest
+import jobs
+
+
+@pytest.fixture
+def status_conn(database):
+    conn = psycopg2.connect(database)
+    conn.autocommit = True
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def progress_log(monkeypatch):
+    """Every progress update the jobs make, unthrottled."""
+    monkeypatch.setattr(jobs, 'JOB_PROGRESS_INTERVAL', 0)
+    log = []
+    report = jobs.JobContext.progress
+
+    def recording(ctx, fraction, message=None):
+        log.append((fraction, message))
+        report(ctx, fraction, message)
+    monkeypatch.setattr(jobs.JobContext, 'progress', recording)
+    return log
+
+
+def _run_job(client, owner, status_conn, **request):
+    response = client.post('/api/jobs', headers=owner.headers, **request)
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert jobs.run_one(status_conn, 'test-worker')
+    job = client.get(f'/api/jobs/{job_id}', headers=owner.headers).get_json()
+    assert job['status'] == 'succeeded', job['error']
+    return job
+
+
+def test_export_job_streams_its_file_through_a_large_object(client, owner, status_conn, progress_log, monkeypatch):
+    owner.add_items(5)
+    monkeypatch.setattr('export.EXPORT_FETCH_SIZE', 2)
+    job = _run_job(client, owner, status_conn, json={"kind": "export", "params": {"dataset": "items"}})
+    assert job['has_download'] and job['result']['rows'] == 5
+    fractions = [fraction for fraction, _ in progress_log]
+    assert len(fractions) == 4 and fractions == sorted(fractions)
+    assert max(fractions[:-1]) < 1.0 and fractions[-1] == 1.0
+    assert progress_log[-1][1] == "5 rows exported"
+
+    downloaded = client.get(f"/api/jobs/{job['id']}/result", headers=owner.headers)
+    assert downloaded.status_code == 200
+    data = downloaded.get_data()
+    assert len(data) == job['result']['bytes']
+    assert data == client.get('/api/export/items', headers=owner.headers).get_data()
+
+    cur = status_conn.cursor()
+    cur.execute("SELECT result_oid FROM jobs WHERE id = %s;", (job['id'],))
+    oid = cur.fetchone()[0]
+    cur.execute("DELETE FROM jobs WHERE id = %s;", (job['id'],))
+    cur.execute("SELECT COUNT(*) FROM pg_largeobject_metadata WHERE oid = %s;", (oid,))
+    assert cur.fetchone()[0] == 0
+
+
+def test_import_and_backfill_jobs_report_progress(client, owner, status_conn, progress_log):
+    csv_file = ("name,retail_price\n" + "".join(f"Imported {n},10\n" for n in range(50))).encode()
+    _run_job(client, owner, status_conn, data={"kind": "import", "file": (io.BytesIO(csv_file), "items.csv")},
+             content_type='multipart/form-data')
+    fractions = [fraction for fraction, _ in progress_log]
+    assert fractions == sorted(fractions) and fractions[-1] == 0.8 and 0.6 in fractions
+
+    progress_log.clear()
+    _run_job(client, owner, status_conn, json={"kind": "rollup_backfill"})
+    assert [fraction for fraction, _ in progress_log] == [0.2, 0.6]
+
+
+def test_heartbeat_renews_the_lease_of_a_silent_job(client, owner, status_conn, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_HEARTBEAT_INTERVAL', 0.05)
+    seen = []
+
+    def silent(ctx):
+        cur = ctx._status_conn.cursor()
+        for _ in range(2):
+            cur.execute("SELECT locked_at FROM jobs WHERE id = %s;", (ctx.id,))
+            seen.append(cur.fetchone()[0])
+            time.sleep(0.3)
+        return {}
+    monkeypatch.setitem(jobs.JOB_KINDS, 'rollup_backfill', silent)
+    _run_job(client, owner, status_conn, json={"kind": "rollup_backfill"})
+    assert seen[1] > seen[0]
@@ -0,0 +1,41 @@
+"""Under gunicorn any worker may answer a scrape, so /metrics must report
+every worker's requests, not just its own."""
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+from app import app
+client = app.test_client()
+for _ in range({requests}):
+    assert client.get('/').status_code == 200
+{extra}
+"""
+
+
+def _run_worker(tmp_path, database, requests, extra=""):
+    env = {
+        **os.environ,
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path / "metrics"),
+        "PYTHONPATH": os.pathsep.join([str(tmp_path), BACKEND_DIR]),
+    }
+    script = textwrap.dedent(WORKER).format(requests=requests, extra=extra)
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+def test_metrics_add_up_requests_across_worker_processes(tmp_path, database):
+    (tmp_path / "metrics").mkdir()
+    (tmp_path / "config.py").write_text(f"DATABASE_URL = {database!r}\nSECRET_KEY = 'metrics-test'\n")
+
+    _run_worker(tmp_path, database, 2)
+    _run_worker(tmp_path, database, 3)
+    scrape = _run_worker(tmp_path, database, 0, extra="print(client.get('/metrics').get_data(as_text=True))")
+
+    assert 'http_requests_total{endpoint="index",method="GET",status="200"} 5.0' in scrape
+    assert "db_pool_max_size" in scrape
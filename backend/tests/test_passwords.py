@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import uuid
+import bcrypt
+import pytest
+import auth
+import passwords
+from passwords import HashingBusy
+
+HOLD_SLOTS = """
+import fcntl, os, sys
+fds = []
+for slot in range(int(sys.argv[2])):
+    fd = os.open(os.path.join(sys.argv[1], f'slot-{slot}'), os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    fds.append(fd)
+print('held', flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.fixture
+def slot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(passwords, 'BCRYPT_ROUNDS', 4)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOTS', 2)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOT_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.skipif(passwords.fcntl is None, reason="host-wide slots need fcntl")
+def test_slots_held_by_another_process_make_hashing_busy(slot_dir):
+    holder = subprocess.Popen(
+        [sys.executable, '-c', HOLD_SLOTS, str(slot_dir), '2'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == 'held'
+        with pytest.raises(HashingBusy):
+            passwords.hash_password('secret')
+    finally:
+        holder.stdin.close()
+        holder.wait()
+    assert passwords.check_password('secret', passwords.hash_password('secret'))
+
+
+def test_busy_rehash_does_not_fail_a_correct_login(client, db_conn, slot_dir, monkeypatch):
+    phone = '9' + str(uuid.uuid4().int)[:9]
+    old_hash = bcrypt.hashpw(b'secret', bcrypt.gensalt(rounds=5)).decode('utf-8')
+    cur = db_conn.cursor()
+    cur.execute("INSERT INTO users (phone_number, password_hash) VALUES (%s, %s);", (phone, old_hash))
+
+    def busy(password):
+        raise HashingBusy("Too many sign-ins in progress, please retry")
+    monkeypatch.setattr(auth, 'hash_password', busy)
+
+    response = client.post('/api/session', json={"phoneNumber": phone, "password": "secret", "otp": phone[-4:]})
+    assert response.status_code == 200
+    cur.execute("SELECT password_hash FROM users WHERE phone_number = %s;", (phone,))
+    assert cur.fetchone()[0] == old_hash
+
+
+@pytest.mark.parametrize("workers, slots", [("1", "1"), ("4", "3"), ("8", "7")])
+def test_default_slots_leave_a_worker_free(workers, slots):
+    env = {key: value for key, value in os.environ.items() if key != 'PASSWORD_HASH_SLOTS'}
+    result = subprocess.run(
+        [sys.executable, '-c', 'import passwords; print(passwords.PASSWORD_HASH_SLOTS)'],
+        cwd=os.path.dirname(passwords.__file__), env={**env, 'WEB_CONCURRENCY': workers},
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == slots
@@ -0,0 +1,45 @@
+"""Query counts of the hot endpoints must not grow with the number of bill lines."""
+import pytest
+
+BUDGETS = {
+    "bills.create_new_bill": 16,
+    "bills.update_bill": 21,
+    "bills.get_bills": 1,
+    "bills.get_bill_details": 1,
+    "items.get_items": 2,
+}
+
+
+def _lines(item_ids, quantity):
+    return [{"item": {"id": item_id}, "quantity": quantity, "price": 10} for item_id in item_ids]
+
+
+@pytest.mark.query_budget(BUDGETS)
+@pytest.mark.parametrize("line_count", [1, 25])
+def test_bill_endpoints_stay_within_budget(client, owner, line_count):
+    item_ids = owner.add_items(line_count)
+    response = client.post('/api/create-bill', json={
+        "billItems": _lines(item_ids, 1), "totalAmount": 10 * line_count, "status": "paid",
+        "amountPaid": 0, "customerPhone": "9000000009", "customerName": "Budget",
+    }, headers=owner.headers)
+    assert response.status_code == 201
+    bill_id = response.get_json()["bill_id"]
+
+    response = client.put(f'/api/bills/{bill_id}', json={
+        "billItems": _lines(item_ids, 2), "totalAmount": 20 * line_count, "status": "paid",
+        "amountPaid": 0, "customerPhone": "9000000009",
+    }, headers=owner.headers)
+    assert response.status_code == 200
+    assert client.get('/api/bills', headers=owner.headers).status_code == 200
+    assert client.get(f'/api/bills/{bill_id}', headers=owner.headers).status_code == 200
+    assert client.get('/api/items', headers=owner.headers).status_code == 200
+
+
+
+def test_slow_queries_are_logged_without_values(app, monkeypatch, caplog):
+    import querylog
+    monkeypatch.setattr(querylog, 'SLOW_QUERY_MS', 0)
+    with app.test_request_context('/api/items'), caplog.at_level('WARNING', logger='querylog'):
+        querylog._on_query("SELECT * FROM items WHERE name = %s;", ("secret",), 0.5, 1)
+    assert "Slow query (500 ms, 1 rows)" in caplog.text
+    assert "params=['str']" in caplog.text and "secret" not in caplog.text
@@ -0,0 +1,120 @@
+"""The hot lookups must be served by the indexes in migrations/, checked
+with EXPLAIN on a database seeded to a realistic shape and ANALYZEd."""
+import json
+import pytest
+
+SHOPS = 200
+ITEMS_PER_SHOP = 100
+BILLS_PER_SHOP = 50
+CUSTOMERS_PER_SHOP = 60
+# Signed-up users whose shops hold no data yet, so the shop table is not tiny.
+IDLE_SHOPS = 5000
+
+HOT_QUERIES = {
+    "active items": (
+        "SELECT id, name, stock_quantity FROM items WHERE shop_id = %(shop)s AND is_delete = 0;",
+        "items_shop_id_name_active_idx",
+    ),
+    "import name match": (
+        "SELECT id FROM items WHERE shop_id = %(shop)s AND is_delete = 0 AND name = 'Item 7';",
+        "items_shop_id_name_active_idx",
+    ),
+    "deleted items": (
+        "SELECT id, name FROM items WHERE shop_id = %(shop)s AND is_delete = 1;",
+        "items_shop_id_deleted_idx",
+    ),
+    "bills page": (
+        "SELECT id, total_amount FROM bills WHERE shop_id = %(shop)s ORDER BY bill_date DESC, id DESC LIMIT 50;",
+        "bills_shop_id_bill_date_idx",
+    ),
+    "bill lines": (
+        "SELECT item_id, quantity FROM bill_items WHERE bill_id = %(bill)s;",
+        "bill_items_bill_id_idx",
+    ),
+    "customer by phone": (
+        "SELECT id FROM customers WHERE shop_id = %(shop)s AND phone_number = '9000000001';",
+        "customers_shop_id_phone_number_idx",
+    ),
+    "customer by trimmed phone": (
+        "SELECT id FROM customers WHERE shop_id = %(shop)s AND btrim(phone_number) = '9000000001' LIMIT 1;",
+        "customers_shop_id_btrim_phone_idx",
+    ),
+    "active customers": (
+        "SELECT id, name FROM customers WHERE shop_id = %(shop)s AND is_delete = 0 ORDER BY name;",
+        "customers_shop_id_name_active_idx",
+    ),
+    "shop of the user": (
+        "SELECT id, name FROM shop WHERE user_id = %(user)s LIMIT 1;",
+        "shop_user_id_idx",
+    ),
+}
+
+
+@pytest.fixture(scope='module')
+def seeded(database):
+    import psycopg2
+    conn = psycopg2.connect(database)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("""
+        WITH new_users AS (
+            INSERT INTO users (phone_number, password_hash)
+            SELECT 'plan-' || n || '-' || gen_random_uuid(), 'x' FROM generate_series(1, %(shops)s) n
+            RETURNING id
+        ), new_shops AS (
+            INSERT INTO shop (user_id, name) SELECT id, 'Plan shop' FROM new_users RETURNING id
+        ), new_items AS (
+            INSERT INTO items (shop_id, name, retail_price, stock_quantity, is_delete)
+            SELECT s.id, 'Item ' || n, 10, 100, CASE WHEN n %% 20 = 0 THEN 1 ELSE 0 END
+            FROM new_shops s, generate_series(1, %(items)s) n
+            RETURNING shop_id
+        ), new_customers AS (
+            INSERT INTO customers (shop_id, name, phone_number, is_delete)
+            SELECT s.id, 'Customer ' || n, '90000000' || lpad(n::text, 2, '0'),
+                   CASE WHEN n %% 10 = 0 THEN 1 ELSE 0 END
+            FROM new_shops s, generate_series(1, %(customers)s) n
+        )
+        INSERT INTO bills (shop_id, total_amount, amount_paid, status, bill_date)
+        SELECT s.id, 100, 100, 'paid', now() - n * interval '1 hour'
+        FROM new_shops s, generate_series(1, %(bills)s) n;
+    """, {"shops": SHOPS, "items": ITEMS_PER_SHOP, "bills": BILLS_PER_SHOP, "customers": CUSTOMERS_PER_SHOP})
+    cur.execute("""
+        WITH idle_users AS (
+            INSERT INTO users (phone_number, password_hash)
+            SELECT 'idle-' || n || '-' || gen_random_uuid(), 'x' FROM generate_series(1, %s) n
+            RETURNING id
+        )
+        INSERT INTO shop (user_id, name) SELECT id, 'Idle shop' FROM idle_users;
+    """, (IDLE_SHOPS,))
+    cur.execute("""
+        INSERT INTO bill_items (bill_id, item_id, quantity, price_per_unit)
+        SELECT b.id, i.id, 1, 10
+        FROM bills b
+        CROSS JOIN LATERAL (SELECT id FROM items WHERE shop_id = b.shop_id LIMIT 2) i;
+    """)
+    cur.execute("ANALYZE;")
+    cur.execute("""
+        SELECT b.shop_id, b.id, s.user_id FROM bills b JOIN shop s ON s.id = b.shop_id
+        ORDER BY random() LIMIT 1;
+    """)
+    shop_id, bill_id, user_id = cur.fetchone()
+    yield cur, {"shop": shop_id, "bill": bill_id, "user": user_id}
+    conn.close()
+
+
+def _index_names(plan):
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_its_index(seeded, name):
+    cur, params = seeded
+    sql, index = HOT_QUERIES[name]
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    assert index in _index_names(plan[0]["Plan"]), json.dumps(plan, indent=2)
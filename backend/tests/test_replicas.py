@@ -0,0 +1,42 @@
+import pytest
+import db
+
+
+@pytest.fixture
+def replica_checkouts(database, monkeypatch):
+    """Routes replica reads to the test database itself and counts them."""
+    monkeypatch.setattr(db, '_replicas', [db.Replica(database)])
+    checkouts = []
+    replica_connection = db._replica_connection
+
+    def counting():
+        conn = replica_connection()
+        checkouts.append(conn is not None)
+        return conn
+    monkeypatch.setattr(db, '_replica_connection', counting)
+    return checkouts
+
+
+def test_reads_after_a_write_stick_to_the_primary_for_that_client(app, owner, replica_checkouts):
+    writer, other = app.test_client(), app.test_client()
+    item_id, = owner.add_items(1)
+    response = writer.patch(f'/api/items/{item_id}/stock', json={"action": "increment"}, headers=owner.headers)
+    assert response.status_code == 200
+    assert 'last_write=' in response.headers['Set-Cookie']
+
+    assert writer.get('/api/items', headers=owner.headers).status_code == 200
+    assert replica_checkouts == []
+    assert other.get('/api/items', headers=owner.headers).status_code == 200
+    assert replica_checkouts == [True]
+
+
+def test_stale_or_forged_write_markers_are_ignored():
+    assert not db.recently_wrote(None)
+    assert not db.recently_wrote('nan')
+    assert not db.recently_wrote('1')
+    assert not db.recently_wrote('not a time')
+
+
+def test_db_pool_does_not_expose_replica_errors(client, replica_checkouts):
+    replicas = client.get('/api/db-pool').get_json()['replicas']
+    assert len(replicas) == 1 and 'error' not in replicas[0]
@@ -0,0 +1,16 @@
+from datetime import date
+from reports import item_sales
+
+
+def test_margins_put_items_without_cost_last(client, owner, db_conn):
+    costed, uncosted = owner.add_items(2, price=10, cost=6)
+    cur = db_conn.cursor()
+    cur.execute("UPDATE items SET cost_price = NULL WHERE id = %s;", (uncosted,))
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 1, "price": 10} for item_id in (costed, uncosted)],
+        "totalAmount": 20, "status": "paid", "amountPaid": 20,
+    }, headers=owner.headers)
+    assert response.status_code == 201
+
+    rows = item_sales(cur, owner.shop_id, date.today(), date.today(), order_by='gross_margin')
+    assert [(row['id'], row['gross_margin']) for row in rows] == [(costed, 4), (uncosted, None)]
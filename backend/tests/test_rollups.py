@@ -0,0 +1,76 @@
+import psycopg2
+import pytest
+from rollups import backfill, record_bill
+
+
+def _create_bill(client, owner, item_id):
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 2, "price": 10}],
+        "totalAmount": 20, "status": "paid", "amountPaid": 20,
+    }, headers=owner.headers)
+    assert response.status_code == 201
+    return response.get_json()["bill_id"]
+
+
+def _rollups(cur, shop_id):
+    cur.execute("SELECT day, revenue, bill_count, items_sold FROM daily_sales WHERE shop_id = %s ORDER BY day;", (shop_id,))
+    days = cur.fetchall()
+    cur.execute("SELECT day, item_id, quantity FROM item_daily_sales WHERE shop_id = %s ORDER BY day, item_id;", (shop_id,))
+    return days, cur.fetchall()
+
+
+def test_backfill_rebuilds_the_incremental_rollups(client, owner, db_conn):
+    item_id, = owner.add_items(1)
+    _create_bill(client, owner, item_id)
+    _create_bill(client, owner, item_id)
+    cur = db_conn.cursor()
+    before = _rollups(cur, owner.shop_id)
+
+    backfill(cur, owner.shop_id)
+    assert _rollups(cur, owner.shop_id) == before
+
+
+def test_one_shop_backfill_does_not_block_other_shops(client, owner, db_conn, database):
+    from conftest import ShopOwner
+    other = ShopOwner(db_conn)
+    item_id, = owner.add_items(1)
+    other_item_id, = other.add_items(1)
+    bill_id = _create_bill(client, owner, item_id)
+    other_bill_id = _create_bill(client, other, other_item_id)
+
+    rebuilding = psycopg2.connect(database)
+    writer = psycopg2.connect(database)
+    try:
+        backfill(rebuilding.cursor(), owner.shop_id)  # held open until rollback
+        cur = writer.cursor()
+        cur.execute("SET lock_timeout = '2s';")
+        record_bill(cur, other_bill_id, 1)
+        writer.rollback()
+
+        cur.execute("SET lock_timeout = '200ms';")
+        with pytest.raises(psycopg2.errors.LockNotAvailable):
+            record_bill(cur, bill_id, 1)
+    finally:
+        writer.rollback()
+        rebuilding.rollback()
+        writer.close()
+        rebuilding.close()
+
+
+def test_header_only_edit_leaves_item_rollup_rows_alone(client, owner, db_conn):
+    item_id, = owner.add_items(1)
+    bill_id = _create_bill(client, owner, item_id)
+    cur = db_conn.cursor()
+    cur.execute("SELECT xmin::text, quantity FROM item_daily_sales WHERE shop_id = %s;", (owner.shop_id,))
+    before = cur.fetchall()
+
+    response = client.put(f'/api/bills/{bill_id}', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 2, "price": 10}],
+        "totalAmount": 20, "status": "unpaid", "amountPaid": 0,
+    }, headers=owner.headers)
+    assert response.status_code == 200
+
+    cur.execute("SELECT xmin::text, quantity FROM item_daily_sales WHERE shop_id = %s;", (owner.shop_id,))
+    assert cur.fetchall() == before
+    cur.execute("SELECT amount_paid FROM daily_sales WHERE shop_id = %s;", (owner.shop_id,))
+    assert cur.fetchone()[0] == 0
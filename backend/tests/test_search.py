@@ -0,0 +1,52 @@
+import random
+import search
+from search import ItemSearchIndex
+
+
+def _reference(items, query, limit):
+    """The straightforward scan-and-sort the index must agree with."""
+    index = ItemSearchIndex(0, [])
+    q = query.strip().lower()
+    matches = []
+    for item in items:
+        name, description = item['name'].lower(), (item['description'] or '').lower()
+        rank = index._rank(q, name, name.split(), description)
+        if rank is not None:
+            matches.append((rank, len(name), name, item['id']))
+    return [match[3] for match in sorted(matches)[:limit]]
+
+
+def test_index_matches_reference_ranking():
+    rng = random.Random(7)
+    words = [''.join(rng.choice('abcde') for _ in range(rng.randint(2, 6))) for _ in range(200)]
+    items = [
+        {"id": str(n), "name": ' '.join(rng.sample(words, 2)).title(),
+         "description": ' '.join(rng.sample(words, 4)) if n % 3 else None}
+        for n in range(2000)
+    ]
+    index = ItemSearchIndex(1, items)
+    index.remove('5')
+    index.upsert({"id": '6', "name": "Ab renamed", "description": None})
+    items = [item for item in items if item['id'] not in ('5', '6')] + [{"id": '6', "name": "Ab renamed", "description": None}]
+    for query in ['a', 'ab', 'cd', 'e a', ' B ', 'zz'] + rng.sample(words, 20):
+        for limit in (1, 20, 100):
+            assert index.search(query, limit) == _reference(items, query, limit), (query, limit)
+
+
+def test_sales_do_not_rebuild_the_index(client, owner):
+    item_id, other_id = owner.add_items(2, stock=50)
+    response = client.get('/api/items/search?q=item', headers=owner.headers)
+    assert response.status_code == 200
+    index = search._indexes.get(owner.shop_id)
+    assert index is not None
+
+    response = client.post('/api/create-bill', json={
+        "billItems": [{"item": {"id": item_id}, "quantity": 3, "price": 10}],
+        "totalAmount": 30, "status": "paid", "amountPaid": 30,
+    }, headers=owner.headers)
+    assert response.status_code == 201
+
+    response = client.get('/api/items/search?q=item', headers=owner.headers)
+    assert search._indexes.get(owner.shop_id) is index
+    stock = {item['id']: item['stock_quantity'] for item in response.get_json()['items']}
+    assert stock == {item_id: 47, other_id: 50}
@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.mark.parametrize("adjustment", [
+    {"delta": "NaN"},
+    {"delta": "Infinity"},
+    {"delta": "-sNaN"},
+    {"delta": "ten"},
+    {"id": "not-a-uuid", "delta": 1},
+    {"id": None, "delta": 1},
+])
+def test_stock_adjustments_reject_bad_input(client, owner, db_conn, adjustment):
+    item_id, = owner.add_items(1, stock=5)
+    response = client.patch('/api/items/stock', json={
+        "adjustments": [{"id": item_id, **adjustment}],
+    }, headers=owner.headers)
+    assert response.status_code == 400
+
+    cur = db_conn.cursor()
+    cur.execute("SELECT stock_quantity FROM items WHERE id = %s;", (item_id,))
+    assert cur.fetchone()[0] == 5
+
+
+def test_stock_adjustments_apply_together(client, owner, db_conn):
+    first, second = owner.add_items(2, stock=5)
+    response = client.patch('/api/items/stock', json={
+        "adjustments": [{"id": first, "delta": -2}, {"id": second, "delta": "1.5"}, {"id": first, "delta": 1}],
+    }, headers=owner.headers)
+    assert response.status_code == 200
+    assert {row["id"]: row["stock_quantity"] for row in response.get_json()["items"]} == {
+        str(first): 4, str(second): 6.5,
+    }
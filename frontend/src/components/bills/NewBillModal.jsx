@@ -30,7 +30,7 @@ export default function NewBillModal({ open, onClose, onCreated }) {
     const fetchItems = useCallback(async () => {
         try {
             const token = localStorage.getItem('authToken');
-            const res = await fetch('/api/items', { headers: { 'Authorization': `Bearer ${token}` } });
+            const res = await fetch('/api/items?fields=id,name,cost_price,wholesale_price,retail_price,stock_quantity,si_unit', { headers: { 'Authorization': `Bearer ${token}` } });
             const data = await res.json();
             if (res.ok) {
                 setAllItems(data.items || []);
@@ -45,23 +45,18 @@ export default function NewBillModal({ open, onClose, onCreated }) {
     const fetchCustomerPrices = async (phoneNumber) => {
         try {
             const token = localStorage.getItem('authToken');
-            const res = await fetch(`/api/customer-prices?phone_number=${phoneNumber}`, {
+            // The catalog is already loaded; only the customer's overrides are fetched.
+            const res = await fetch(`/api/customer-prices?phone_number=${phoneNumber}&mode=overrides`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
             const data = await res.json();
             if (res.ok) {
-                if (data.customer_items && data.customer_items.length > 0) {
-                    const itemsWithCustomPrices = data.items.map(item => {
-                        const customerItem = data.customer_items.find(ci => ci.id === item.id);
-                        if (customerItem) {
-                            return { ...item, custom_price: customerItem.custom_price };
-                        }
-                        return item;
-                    });
-                    setAllItems(itemsWithCustomPrices);
+                const overrides = new Map((data.overrides || []).map(o => [o.id, o.custom_price]));
+                setAllItems(items => items.map(({ custom_price, ...item }) => (
+                    overrides.has(item.id) ? { ...item, custom_price: overrides.get(item.id) } : item
+                )));
+                if (overrides.size > 0) {
                     setPriceType('customer_specific');
-                } else {
-                    setAllItems(data.items);
                 }
             } else {
                 throw new Error(data.error || 'Failed to fetch customer prices');
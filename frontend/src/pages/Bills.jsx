@@ -1,4 +1,4 @@
-import React, { useMemo, useState, useEffect, useCallback } from 'react';
+import React, { useRef, useState, useEffect, useCallback } from 'react';
 import { useShop } from '../context/ShopContext';
 import NewBillModal from '../components/bills/NewBillModal';
 import EditBillModal from '../components/bills/EditBillModal';
@@ -173,38 +173,72 @@ export default function BillsPage() {
     const [billToDelete, setBillToDelete] = useState(null);
     const [restoreItems, setRestoreItems] = useState(false);
 
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    // The search runs on the server, over every bill, once typing pauses
+    const [searchTerm, setSearchTerm] = useState('');
+    const latestFetch = useRef(0);
+
+    useEffect(() => {
+        const timeout = setTimeout(() => setSearchTerm(query.trim()), 300);
+        return () => clearTimeout(timeout);
+    }, [query]);
+
+    const billsUrl = useCallback((cursor) => {
+        const params = new URLSearchParams();
+        if (searchTerm) params.set('q', searchTerm);
+        if (cursor) params.set('cursor', cursor);
+        const search = params.toString();
+        return search ? `/api/bills?${search}` : '/api/bills';
+    }, [searchTerm]);
+
     const fetchBills = useCallback(async () => {
+        // Only the newest search may fill the list, whatever order responses arrive in
+        const fetchId = ++latestFetch.current;
         setLoading(true);
         setError('');
         try {
             const token = localStorage.getItem('authToken');
-            const res = await fetch('/api/bills', { headers: { 'Authorization': `Bearer ${token}` } });
+            const res = await fetch(billsUrl(), { headers: { 'Authorization': `Bearer ${token}` } });
             const data = await res.json();
+            if (fetchId !== latestFetch.current) return;
             if (!res.ok) {
                 throw new Error(data.error || 'Failed to load bills');
             } else {
                 setBills(Array.isArray(data.bills) ? data.bills : []);
+                setNextCursor(data.next_cursor || null);
             }
         } catch (e) {
-            setError(e.message || 'Failed to load bills');
+            if (fetchId === latestFetch.current) setError(e.message || 'Failed to load bills');
+        } finally {
+            if (fetchId === latestFetch.current) setLoading(false);
+        }
+    }, [billsUrl]);
+
+    const fetchMoreBills = async () => {
+        if (!nextCursor) return;
+        // A new search started meanwhile replaces the list, so this page is dropped
+        const fetchId = latestFetch.current;
+        setLoadingMore(true);
+        try {
+            const token = localStorage.getItem('authToken');
+            const res = await fetch(billsUrl(nextCursor), { headers: { 'Authorization': `Bearer ${token}` } });
+            const data = await res.json();
+            if (fetchId !== latestFetch.current) return;
+            if (!res.ok) throw new Error(data.error || 'Failed to load bills');
+            setBills(prev => [...prev, ...(Array.isArray(data.bills) ? data.bills : [])]);
+            setNextCursor(data.next_cursor || null);
+        } catch (e) {
+            if (fetchId === latestFetch.current) setError(e.message || 'Failed to load bills');
         } finally {
-            setLoading(false);
+            setLoadingMore(false);
         }
-    }, []);
+    };
 
     useEffect(() => {
         fetchBills();
     }, [fetchBills]);
 
-    const filteredBills = useMemo(() => {
-        const q = query.trim().toLowerCase();
-        if (!q) return bills;
-        return bills.filter((bill) =>
-            bill.id.toLowerCase().includes(q) ||
-            (bill.customer_name && bill.customer_name.toLowerCase().includes(q))
-        );
-    }, [bills, query]);
-
     const handleNewBill = () => setShowNew(true);
     
     const handleView = async (bill) => {
@@ -280,8 +314,19 @@ export default function BillsPage() {
             <div className="w-full px-4 sm:px-6 lg:px-10 py-6 space-y-4">
                 <HeaderBar onNewBill={handleNewBill} />
                 <SearchBar value={query} onChange={setQuery} />
-                <BillsTable bills={filteredBills} onView={handleView} onEdit={handleEdit} onDelete={handleDeleteRequest} loading={loading} error={error} />
-                <BillsCards bills={filteredBills} onView={handleView} onEdit={handleEdit} onDelete={handleDeleteRequest} loading={loading} error={error} />
+                <BillsTable bills={bills} onView={handleView} onEdit={handleEdit} onDelete={handleDeleteRequest} loading={loading} error={error} />
+                <BillsCards bills={bills} onView={handleView} onEdit={handleEdit} onDelete={handleDeleteRequest} loading={loading} error={error} />
+                {nextCursor && !loading && (
+                    <div className="flex justify-center">
+                        <button
+                            onClick={fetchMoreBills}
+                            disabled={loadingMore}
+                            className="px-4 py-2 rounded-md border border-slate-200 bg-white hover:bg-slate-50 text-sm text-slate-700 shadow-sm disabled:opacity-50"
+                        >
+                            {loadingMore ? 'Loading...' : 'Load more'}
+                        </button>
+                    </div>
+                )}
             </div>
             <NewBillModal open={showNew} onClose={() => setShowNew(false)} onCreated={fetchBills} />
             {editingBill && 
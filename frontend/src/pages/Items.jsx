@@ -4,6 +4,12 @@ import EditItemModal from '../components/items/EditItemModal';
 import StockControl from '../components/items/StockControl';
 import ConfirmationModal from '../components/common/ConfirmationModal';
 
+// Prices arrive as JSON numbers (10.5), so two decimals are added here
+function formatPrice(price, unit) {
+    if (!price) return '-';
+    return `₹${Number(price).toFixed(2)}${unit ? `/${unit}` : ''}`;
+}
+
 function HeaderBar({ onNewItem, initials, showDeleted, onToggleShowDeleted }) {
     return (
         <div className="w-full flex flex-col sm:flex-row sm:items-center sm:justify-between gap-3">
@@ -86,9 +92,9 @@ function ItemsTable({ items, onEdit, onDelete, onStockChange, loading, error, st
                                     {it.name}
                                     <p className="text-xs text-slate-500 font-normal">{it.description || ''}</p>
                                 </td>
-                                <td className="px-4 py-3 text-slate-700">{it.cost_price ? `₹${it.cost_price}${it.si_unit ? `/${it.si_unit}` : ''}` : '-'}</td>
-                                <td className="px-4 py-3 text-slate-800 font-semibold">{it.retail_price ? `₹${it.retail_price}${it.si_unit ? `/${it.si_unit}` : ''}` : '-'}</td>
-                                <td className="px-4 py-3 text-slate-700">{it.wholesale_price ? `₹${it.wholesale_price}${it.si_unit ? `/${it.si_unit}` : ''}` : '-'}</td>
+                                <td className="px-4 py-3 text-slate-700">{formatPrice(it.cost_price, it.si_unit)}</td>
+                                <td className="px-4 py-3 text-slate-800 font-semibold">{formatPrice(it.retail_price, it.si_unit)}</td>
+                                <td className="px-4 py-3 text-slate-700">{formatPrice(it.wholesale_price, it.si_unit)}</td>
                                 {!showDeleted && (
                                     <td className="px-4 py-3">
                                         <StockControl 
@@ -157,9 +163,9 @@ function ItemsCards({ items, onEdit, onDelete, onStockChange, loading, error, st
                         </div>
                     </div>
                     <div className="mt-3 grid grid-cols-3 gap-2 text-sm">
-                        <div className="bg-slate-50 text-slate-700 rounded-md px-2 py-1 text-center">Cost {it.cost_price ? `₹${it.cost_price}${it.si_unit ? `/${it.si_unit}` : ''}` : '-'}</div>
-                        <div className="bg-emerald-50 text-emerald-700 rounded-md px-2 py-1 text-center font-semibold">Retail {it.retail_price ? `₹${it.retail_price}${it.si_unit ? `/${it.si_unit}` : ''}` : '-'}</div>
-                        <div className="bg-teal-50 text-teal-700 rounded-md px-2 py-1 text-center">Wholesale {it.wholesale_price ? `₹${it.wholesale_price}${it.si_unit ? `/${it.si_unit}` : ''}` : '-'}</div>
+                        <div className="bg-slate-50 text-slate-700 rounded-md px-2 py-1 text-center">Cost {formatPrice(it.cost_price, it.si_unit)}</div>
+                        <div className="bg-emerald-50 text-emerald-700 rounded-md px-2 py-1 text-center font-semibold">Retail {formatPrice(it.retail_price, it.si_unit)}</div>
+                        <div className="bg-teal-50 text-teal-700 rounded-md px-2 py-1 text-center">Wholesale {formatPrice(it.wholesale_price, it.si_unit)}</div>
                     </div>
                     {!showDeleted && (
                         <div className="mt-3 flex items-center justify-between gap-2 text-sm">